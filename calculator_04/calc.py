@@ -6,7 +6,11 @@
 #   Python code for assignment 2 of Plab2 2019
 
 from sys import stdin
+from array import array
+from collections import deque
+from functools import lru_cache
 from numbers import Number as Num
+import re
 
 import numpy as np
 
@@ -34,6 +38,45 @@ def lower(lst):
     return map(lambda x: x.lower(), lst)
 
 
+# Numbers (with exponents), names, operators, parentheses and whitespace,
+# any other character is an error
+TOKEN = re.compile(r'(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)|(?P<name>[A-Za-z_]\w*)'
+                   r'|(?P<operator>[-+*/])|(?P<paren>[()])|(?P<space>\s+)|(?P<error>.)', re.S)
+
+# Names that float() accepts
+FLOAT_NAMES = {'inf', 'infinity', 'nan'}
+
+
+def normalize(str_: str):
+    """The text of the tokens of str_ separated by single spaces, used as
+    the key of compiled expressions"""
+    return ' '.join(match.group() for match in TOKEN.finditer(str_) if match.lastgroup != 'space')
+
+
+class Expression:
+    """The text of an expression, compared and hashed by its normalized
+    text, so expressions that only differ in whitespace share their cache
+    entry, while the original text is kept for the scanner"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.key = normalize(text)
+
+    def __eq__(self, other):
+        return isinstance(other, Expression) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+class ParseError(ValueError):
+    "malformed expression"
+
+    def __init__(self, message: str, position: int):
+        super().__init__('{} at position {}'.format(message, position))
+        self.position = position
+
+
 class Container:
     "Container"
 
@@ -66,12 +109,13 @@ class Container:
 
 class Queue(Container):
     def __init__(self, items=None):
-        super().__init__(items=items)
+        super().__init__()
+        self.items = deque(items or [])
 
     def pop(self):
         "pop"
         assert not self.is_empty()
-        return self.items.pop(0)
+        return self.items.popleft()
 
     def peek(self):
         "peek"
@@ -87,18 +131,21 @@ class Stack(Container):
 
     def pop(self):
         "pop"
-        assert not self.is_empty()
-        return self.items.pop(self.size() - 1)
+        assert self.items
+        return self.items.pop()
 
     def peek(self):
         "peek"
-        assert not self.is_empty()
-        return self.items[self.size() - 1]
+        assert self.items
+        return self.items[-1]
 
 
 class Function:
     "function"
 
+    # Functions bind tighter than every operator
+    strength = float('inf')
+
     def __init__(self, func):
         self.func = func
 
@@ -135,10 +182,157 @@ class Operator:
         return 'Operator({})'.format(self.operation.__name__)
 
 
+class Variable:
+    "variable"
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __eq__(self, other):
+        return isinstance(other, Variable) and other.name == self.name
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __repr__(self):
+        "__repr__"
+        return 'Variable({})'.format(self.name)
+
+
+class Temporary:
+    "temporary, pushes the value stored by Store(index)"
+
+    def __init__(self, index: int):
+        self.index = index
+
+    def __eq__(self, other):
+        return isinstance(other, Temporary) and other.index == self.index
+
+    def __hash__(self):
+        return hash(self.index)
+
+    def __repr__(self):
+        "__repr__"
+        return 'Temporary({})'.format(self.index)
+
+
+class Store(Temporary):
+    "store, keeps the value on top of the stack as Temporary(index)"
+
+    def __eq__(self, other):
+        return isinstance(other, Store) and other.index == self.index
+
+    def __hash__(self):
+        return hash(self.index)
+
+    def __repr__(self):
+        "__repr__"
+        return 'Store({})'.format(self.index)
+
+
+def arity(token):
+    """Number of arguments of an RPN token"""
+    if isinstance(token, Operator):
+        return 2
+    if isinstance(token, Function):
+        return 1
+    return 0
+
+
+# Opcodes of Program
+PUSH, LOAD, CALL1, CALL2, STORE, TEMPORARY = range(6)
+
+
+def op_push(stack, sp, arg, values, temporaries):
+    stack[sp] = arg
+    return sp + 1
+
+
+def op_load(stack, sp, arg, values, temporaries):
+    stack[sp] = values[arg]
+    return sp + 1
+
+
+def op_call1(stack, sp, arg, values, temporaries):
+    stack[sp - 1] = arg(stack[sp - 1])
+    return sp
+
+
+def op_call2(stack, sp, arg, values, temporaries):
+    stack[sp - 2] = arg(stack[sp - 2], stack[sp - 1])
+    return sp - 1
+
+
+def op_store(stack, sp, arg, values, temporaries):
+    temporaries[arg] = stack[sp - 1]
+    return sp
+
+
+def op_temporary(stack, sp, arg, values, temporaries):
+    stack[sp] = temporaries[arg]
+    return sp + 1
+
+
+# The handler of every opcode, indexed by opcode
+DISPATCH = (op_push, op_load, op_call1, op_call2, op_store, op_temporary)
+
+
+class Program:
+    """RPN program compiled to a flat array of opcodes and their arguments,
+    run with a stack allocated to the depth the program needs and
+    dispatched through DISPATCH. Every run has its own stack, so a program
+    can be run by several threads at once."""
+
+    def __init__(self, rpn):
+        self.rpn = tuple(rpn)
+        self.opcodes = array('B')
+        args, temporaries, variables = [], 0, set()
+        depth = max_depth = 0
+        for l in self.rpn:
+            if isinstance(l, Num):
+                opcode, arg, depth = PUSH, l, depth + 1
+            elif isinstance(l, Variable):
+                opcode, arg, depth = LOAD, l.name, depth + 1
+                variables.add(l.name)
+            elif isinstance(l, Store):
+                opcode, arg = STORE, l.index
+                temporaries = max(temporaries, l.index + 1)
+            elif isinstance(l, Temporary):
+                opcode, arg, depth = TEMPORARY, l.index, depth + 1
+            elif isinstance(l, Function):
+                opcode, arg = CALL1, l.func
+            elif isinstance(l, Operator):
+                opcode, arg, depth = CALL2, l.operation, depth - 1
+            else:
+                raise ValueError('Unexpected token {}'.format(l))
+            self.opcodes.append(opcode)
+            args.append(arg)
+            max_depth = max(max_depth, depth)
+        self.args = tuple(args)
+        self.variables = frozenset(variables)
+        self.depth = max_depth
+        self.temporaries = temporaries
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def __call__(self, values=None):
+        """Run the program, values maps the (lower case) variable names to
+        their values"""
+        values = values or {}
+        missing = self.variables.difference(values)
+        if missing:
+            raise NameError('Variable {} is not bound'.format(', '.join(sorted(missing))))
+        stack, temporaries, sp = [None] * self.depth, [None] * self.temporaries, 0
+        for opcode, arg in zip(self.opcodes, self.args):
+            sp = DISPATCH[opcode](stack, sp, arg, values, temporaries)
+        return stack[0] if sp else None
+
+
 class Calculator:
     "calculator"
 
-    def __init__(self):
+    def __init__(self, cache_size=1024, optimize=True):
         self.functions = {
             'exp': Function(np.exp),
             'log': Function(np.log),
@@ -153,17 +347,122 @@ class Calculator:
             '/': Operator(np.divide, 1),
             '-': Operator(np.subtract, 0),
         }
+        # Unary minus of anything but a number
+        self.negate = Function(np.negative)
+
+        # Run optimize on compiled programs
+        self.optimize_programs = optimize
+        # Compiled programs by Expression, least recently used are evicted
+        self.compile_expression = lru_cache(maxsize=cache_size)(self.compile_expression)
 
     def eval(self, lst: list):
         "eval"
         return self.eval_rpn(self.shunting_yard(lst))
 
-    def eval_rpn(self, lst: list):
-        "eval_rpn"
+    def evaluate(self, str_: str, **variables):
+        """Evaluate the expression str_, it is only tokenized and converted
+        to RPN the first time. The variables can be numbers or numpy
+        arrays, which evaluates the expression for every element at once:
+        c.evaluate('exp(x) * y', x=np.arange(10), y=2)"""
+        return self.compile(str_)({name.lower(): value for name, value in variables.items()})
+
+    def compile(self, str_: str):
+        """Returns the (cached) Program of the expression str_"""
+        return self.compile_expression(Expression(str_))
+
+    def compile_expression(self, expression: Expression):
+        """Returns the Program of an Expression, the positions of a
+        ParseError are in its original text"""
+        rpn = self.shunting_yard(self.tokens(expression.text))
+        return Program(self.optimize(rpn) if self.optimize_programs else rpn)
+
+    def optimize(self, lst: list):
+        """Constant folding and common subexpression elimination of the RPN
+        program lst. Subtrees of only numbers are computed once, here, and
+        subtrees that occur more than once are computed the first time and
+        kept in a temporary (see Store and Temporary)"""
+        if not lst:
+            return []
+
+        # Build the expression tree in RPN order, a node is (token, children)
+        # and every distinct subtree is only added once, nodes[i] is the
+        # subtree with the number i. Subtrees are compared by their keys, a
+        # token and the numbers of the children, where numbers are keyed by
+        # their type and repr, as 0.0 == -0.0 but x / 0 != x / -0
+        numbers, nodes = {}, []
+        s = Stack()
+        for l in lst:
+            args = list(reversed(list(map(lambda _: s.pop(), range(arity(l))))))
+            if args and all(map(lambda arg: not nodes[arg][1] and isinstance(nodes[arg][0], Num), args)):
+                l, args = l(*map(lambda arg: nodes[arg][0], args)), []
+            key = (type(l), repr(l)) if isinstance(l, Num) else (l, *args)
+            if key not in numbers:
+                numbers[key] = len(nodes)
+                nodes.append((l, args))
+            s.push(numbers[key])
+        root = s.pop()
+
+        # Count the uses of every subtree, the children of a subtree are
+        # only counted the first time, as it is computed once
+        uses = [0] * len(nodes)
+        todo = [root]
+        while todo:
+            node = todo.pop()
+            uses[node] += 1
+            if uses[node] == 1:
+                todo.extend(nodes[node][1])
+
+        # Emit the children (left first) and then the token of every node,
+        # the walk uses a stack of (node, children emitted) so that deep
+        # trees do not hit the recursion limit
+        program, temporaries = [], {}
+        todo = [(root, False)]
+        while todo:
+            node, emitted = todo.pop()
+            token, children = nodes[node]
+            if not emitted:
+                if node in temporaries:
+                    program.append(Temporary(temporaries[node]))
+                else:
+                    todo.append((node, True))
+                    todo.extend(map(lambda child: (child, False), reversed(children)))
+                continue
+            program.append(token)
+            if children and uses[node] > 1:
+                temporaries[node] = len(temporaries)
+                program.append(Store(temporaries[node]))
+        return program
+
+    def cache_stats(self):
+        """Returns the hits, misses, size, maxsize and hit rate of the cache
+        of compiled programs"""
+        info = self.compile_expression.cache_info()
+        lookups = info.hits + info.misses
+        return {
+            'hits': info.hits,
+            'misses': info.misses,
+            'size': info.currsize,
+            'maxsize': info.maxsize,
+            'hit_rate': info.hits / lookups if lookups else 0.0,
+        }
+
+    def eval_rpn(self, lst: list, variables=None):
+        """eval_rpn, variables maps the (case insensitive) variable names
+        to their values"""
+        values = {name.lower(): value for name, value in (variables or {}).items()}
+        temporaries = {}
         s = Stack()
         for l in lst:
             if isinstance(l, Num):
                 s.push(l)
+            elif isinstance(l, Store):
+                temporaries[l.index] = s.peek()
+            elif isinstance(l, Temporary):
+                s.push(temporaries[l.index])
+            elif isinstance(l, Variable):
+                if l.name not in values:
+                    raise NameError('Variable {} is not bound'.format(l.name))
+                s.push(values[l.name])
             elif isinstance(l, Function):
                 s.push(l(s.pop()))
             elif isinstance(l, Operator):
@@ -175,7 +474,7 @@ class Calculator:
         oq = Queue()
         os = Stack()
         for l in lst:
-            if isinstance(l, Num):
+            if isinstance(l, (Num, Variable)):
                 oq.push(l)
             elif isinstance(l, Function):
                 os.push(l)
@@ -196,23 +495,68 @@ class Calculator:
         while not os.is_empty():
             oq.push(os.pop())
 
-        return oq.items
+        return list(oq.items)
 
     def tokens(self, str_: str):
-        "tokens"
-        s = str_.replace('(', ' ( ')
-        s = s.replace(')', ' ) ')
-
-        for w in lower(words(s)):
-            if is_float(w):
-                yield float(w)
-            elif w in self.operators.keys():
-                yield self.operators[w]
-            elif w in self.functions.keys():
-                print('FUNCTION', w)
-                yield self.functions[w]
+        """Single pass scanner. Yields numbers, Variables, Functions,
+        Operators and '(' and ')'. A '-' where an operand is expected is
+        part of a negative number, or negates the operand that follows.
+        Raises ParseError with the position of malformed input."""
+        operand, negative, opened, empty = True, False, [], True
+        for match in TOKEN.finditer(str_):
+            kind, text, position = match.lastgroup, match.group(), match.start()
+            if kind == 'space':
+                continue
+            if kind == 'error':
+                raise ParseError('Unexpected character {!r}'.format(text), position)
+            empty = False
+
+            if kind == 'operator' and operand:
+                # Unary minus and plus
+                if text == '+':
+                    continue
+                if text != '-':
+                    raise ParseError('Expected an operand', position)
+                if negative:
+                    yield self.negate
+                negative = True
+                continue
+            if (kind in ('number', 'name') or text == '(') and not operand:
+                raise ParseError('Expected an operator', position)
+            if text == ')' and operand:
+                raise ParseError('Expected an operand', position)
+
+            name = text.lower()
+            if kind == 'number' or name in FLOAT_NAMES:
+                yield -float(text) if negative else float(text)
+                negative, operand = False, False
+                continue
+            if negative:
+                yield self.negate
+                negative = False
+
+            if kind == 'operator':
+                operand = True
+                yield self.operators[text]
+            elif name in self.functions:
+                yield self.functions[name]
+            elif kind == 'name':
+                operand = False
+                yield Variable(name)
+            elif text == '(':
+                opened.append(position)
+                yield '('
             else:
-                yield w
+                if not opened:
+                    raise ParseError("Unmatched ')'", position)
+                opened.pop()
+                operand = False
+                yield ')'
+
+        if opened:
+            raise ParseError("Unmatched '('", opened[-1])
+        if operand and not empty:
+            raise ParseError('Unexpected end of input', len(str_))
 
 
 c = Calculator()
@@ -224,4 +568,4 @@ def lines():
 
 
 if __name__ == '__main__':
-    list(map(lambda x: print('==>', c.eval(c.tokens(x)), flush=True), lines()))
+    list(map(lambda x: print('==>', c.evaluate(x), flush=True), lines()))
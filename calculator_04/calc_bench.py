@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# File: calc_bench.py
+# Description:
+#   Benchmarks for calc.py
+"""
+Tokens/sec of the evaluation paths of calc.py, for scalar variables.
+
+Usage: python calc_bench.py [evaluations per expression]
+
+    eval:     c.eval_rpn(c.shunting_yard(c.tokens(expression))), which is
+              what c.eval(c.tokens(expression)) does
+    eval_rpn: c.eval_rpn(rpn) of the RPN program from shunting_yard
+    unoptimized: Program(rpn), the opcode interpreter without optimize
+    program:  the cached Program from c.compile, see Calculator.evaluate
+
+Tokens are counted as the number of tokens of the (unoptimized) RPN program,
+for every path.
+"""
+
+from sys import argv
+import timeit
+
+from calc import Calculator, Program
+
+EXPRESSIONS = [
+    '1 + 2 * 3',
+    'exp ( 1 + 2 * 3 )',
+    'x * x + y * y - 2 * x * y',
+    'sqrt ( x * x + y * y ) / ( 1 + exp ( 0 - x ) )',
+    'sin ( x ) * cos ( y ) + sin ( y ) * cos ( x ) + log ( x + y + 1 )',
+]
+
+
+def tokens_per_second(func, tokens: int, number: int):
+    """Returns the best tokens/sec of 3 runs of number calls of func"""
+    return tokens * number / min(timeit.repeat(func, number=number, repeat=3))
+
+
+def bench(number=10000):
+    """Print the tokens/sec of every path for every expression"""
+    c = Calculator()
+    values = {'x': 0.5, 'y': 2.0}
+    print('{:66} {:>11} {:>11} {:>11} {:>11} {:>8}'.format(
+        'expression', 'eval', 'eval_rpn', 'unoptimized', 'program', 'speedup'))
+    for expression in EXPRESSIONS:
+        rpn = c.shunting_yard(c.tokens(expression))
+        program, unoptimized = c.compile(expression), Program(rpn)
+        slow = tokens_per_second(lambda: c.eval_rpn(c.shunting_yard(c.tokens(expression)), values),
+                                 len(rpn), number)
+        assert unoptimized(values) == c.eval_rpn(rpn, values)
+        plain = tokens_per_second(lambda: c.eval_rpn(rpn, values), len(rpn), number)
+        interpreted = tokens_per_second(lambda: unoptimized(values), len(rpn), number)
+        fast = tokens_per_second(lambda: program(values), len(rpn), number)
+        print('{:66} {:11.0f} {:11.0f} {:11.0f} {:11.0f} {:7.1f}x'.format(
+            expression, slow, plain, interpreted, fast, fast / slow), flush=True)
+
+
+if __name__ == '__main__':
+    bench(*map(int, argv[1:2]))
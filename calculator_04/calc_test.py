@@ -50,6 +50,22 @@ class TestQueue(unittest.TestCase):
 
 
 
+class TestDequeQueue(unittest.TestCase):
+    def test_fifo(self):
+        q = Queue(items=[1, 2])
+        q.push(3)
+        self.assertEqual(q.peek(), 1)
+        self.assertEqual(list(map(lambda _: q.pop(), range(3))), [1, 2, 3])
+        self.assertTrue(q.is_empty())
+
+    def test_empty_push_pop(self):
+        q = Queue()
+        q.push(1)
+        q.push(2)
+        self.assertEqual(q.pop(), 1)
+        self.assertEqual(q.pop(), 2)
+        self.assertTrue(q.is_empty())
+
 class TestFunction(unittest.TestCase):
     def test_exp(self):
         import numpy as np
@@ -97,5 +113,253 @@ class TestCalculator(unittest.TestCase):
        self.assertEqual(tokens, [exp, '(', 1, add, 2, mult, 3, ')'])
        self.assertEqual(np.exp(1+2*3), c.eval(tokens)) #.shunting_yard(tokens))
 
+class TestCompile(unittest.TestCase):
+    def test_evaluate(self):
+        c = Calculator()
+        self.assertEqual(c.evaluate('exp(1 + 2 * 3)'), np.exp(1+2*3))
+        self.assertEqual(c.evaluate('EXP ( 1 + 2 * 3 )'), np.exp(1+2*3))
+
+    def test_cached(self):
+        c = Calculator()
+        program = c.compile('exp(1 + 2 * 3)')
+        self.assertIs(c.compile(' exp ( 1 + 2  *  3 ) '), program)
+        stats = c.cache_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 1, 1))
+        self.assertEqual(stats['hit_rate'], 0.5)
+
+    def test_eviction(self):
+        c = Calculator(cache_size=2)
+        list(map(c.compile, ['1 + 1', '1 + 2', '1 + 1', '1 + 3', '1 + 2']))
+        stats = c.cache_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 4, 2))
+
+class TestVariables(unittest.TestCase):
+    def test_parse(self):
+        c = Calculator()
+        self.assertEqual(list(c.tokens('x * Y')), [Variable('x'), c.operators['*'], Variable('y')])
+
+    def test_scalar(self):
+        c = Calculator()
+        self.assertEqual(c.evaluate('exp(x) * y + 1', x=2, y=3), np.exp(2) * 3 + 1)
+
+    def test_array(self):
+        c = Calculator()
+        x, y = np.linspace(0, 1, 1000000), np.arange(1000000)
+        np.testing.assert_array_equal(c.evaluate('sin(x) * y + x / 2', x=x, Y=y), np.sin(x) * y + x / 2)
+
+    def test_unbound(self):
+        c = Calculator()
+        with self.assertRaises(NameError):
+            c.evaluate('x + y', x=1)
+
+class TestOptimize(unittest.TestCase):
+    expressions = [
+        'exp(2) * x',
+        'sin(x) * sin(x) + sin(x)',
+        '(x + 1) * (x + 1) / (x + 1 + y)',
+        'log(2 * 3 + 4) - exp(x * y) * exp(x * y) + 3 / 4',
+        'sqrt(x * x + y * y) + cos(x * x + y * y)',
+        '1 + 2 * 3',
+        'x',
+        'x / -0 + x / 0',
+    ]
+
+    def test_fold(self):
+        c = Calculator()
+        self.assertEqual(c.compile('exp(2) * x').rpn, (np.exp(2), Variable('x'), c.operators['*']))
+        self.assertEqual(c.compile('1 + 2 * 3').rpn, (7,))
+
+    def test_common_subexpressions(self):
+        c = Calculator()
+        sin, add, mult = c.functions['sin'], c.operators['+'], c.operators['*']
+        x = Variable('x')
+        self.assertEqual(c.compile('sin(x) * sin(x) + sin(x)').rpn,
+                         (x, sin, Store(0), Temporary(0), mult, Temporary(0), add))
+
+    def test_deep(self):
+        c, plain = Calculator(), Calculator(optimize=False)
+        expression = ' + '.join(map(lambda i: 'x * {}'.format(i % 7), range(5000)))
+        self.assertEqual(c.evaluate(expression, x=2.0), plain.evaluate(expression, x=2.0))
+        self.assertEqual(c.compile(' + '.join(['1'] * 5000)).rpn, (5000,))
+
+    def test_same_results(self):
+        optimized, plain = Calculator(), Calculator(optimize=False)
+        x, y = np.linspace(0.1, 2, 1000), np.linspace(-1, 1, 1000)
+        for expression in self.expressions:
+            program = optimized.compile(expression)
+            self.assertLessEqual(len(program), len(plain.compile(expression)))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                np.testing.assert_array_equal(optimized.evaluate(expression, x=x, y=y),
+                                              plain.evaluate(expression, x=x, y=y))
+                # assert_equal, as nan != nan
+                np.testing.assert_equal(optimized.evaluate(expression, x=0.5, y=2),
+                                        plain.evaluate(expression, x=0.5, y=2))
+
+class TestProgram(unittest.TestCase):
+    def test_same_as_eval_rpn(self):
+        c = Calculator(optimize=False)
+        x = np.linspace(0.1, 2, 100)
+        for expression in TestOptimize.expressions:
+            rpn = c.shunting_yard(c.tokens(expression))
+            np.testing.assert_array_equal(Program(rpn)({'x': x, 'y': 2}), c.eval_rpn(rpn, {'x': x, 'y': 2}))
+
+    def test_stack_depth(self):
+        c = Calculator(optimize=False)
+        program = c.compile('1 + 2 * (3 + 4 * 5)')
+        self.assertEqual(program.depth, 5)
+        self.assertEqual(program(), 47)
+
+    def test_more_temporaries_than_depth(self):
+        c = Calculator()
+        expression = '(a+b)+(a+b)+(c+d)+(c+d)+(e+f)+(e+f)+(g+h)+(g+h)'
+        values = dict(zip('abcdefgh', range(1, 9)))
+        program = c.compile(expression)
+        self.assertGreater(program.temporaries, program.depth)
+        self.assertEqual(c.evaluate(expression, **values), 72)
+        self.assertEqual(c.evaluate(expression, **values), 72)
+
+    def test_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+        c, plain = Calculator(), Calculator(optimize=False)
+        expression = 'sin(x) * sin(x) + cos(x) * cos(x) + x'
+        x = np.linspace(0.1, 2, 10000)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda i: c.evaluate(expression, x=x + i), range(50)))
+        for i, result in enumerate(results):
+            np.testing.assert_array_equal(result, plain.evaluate(expression, x=x + i))
+
+    def test_unbound(self):
+        c = Calculator()
+        with self.assertRaises(NameError):
+            c.evaluate('x + y', x=1)
+
+class TestOptimize(unittest.TestCase):
+    expressions = [
+        'exp(2) * x',
+        'sin(x) * sin(x) + sin(x)',
+        '(x + 1) * (x + 1) / (x + 1 + y)',
+        'log(2 * 3 + 4) - exp(x * y) * exp(x * y) + 3 / 4',
+        'sqrt(x * x + y * y) + cos(x * x + y * y)',
+        '1 + 2 * 3',
+        'x',
+        'x / -0 + x / 0',
+    ]
+
+    def test_fold(self):
+        c = Calculator()
+        self.assertEqual(c.compile('exp(2) * x').rpn, (np.exp(2), Variable('x'), c.operators['*']))
+        self.assertEqual(c.compile('1 + 2 * 3').rpn, (7,))
+
+    def test_common_subexpressions(self):
+        c = Calculator()
+        sin, add, mult = c.functions['sin'], c.operators['+'], c.operators['*']
+        x = Variable('x')
+        self.assertEqual(c.compile('sin(x) * sin(x) + sin(x)').rpn,
+                         (x, sin, Store(0), Temporary(0), mult, Temporary(0), add))
+
+    def test_deep(self):
+        c, plain = Calculator(), Calculator(optimize=False)
+        expression = ' + '.join(map(lambda i: 'x * {}'.format(i % 7), range(5000)))
+        self.assertEqual(c.evaluate(expression, x=2.0), plain.evaluate(expression, x=2.0))
+        self.assertEqual(c.compile(' + '.join(['1'] * 5000)).rpn, (5000,))
+
+    def test_same_results(self):
+        optimized, plain = Calculator(), Calculator(optimize=False)
+        x, y = np.linspace(0.1, 2, 1000), np.linspace(-1, 1, 1000)
+        for expression in self.expressions:
+            program = optimized.compile(expression)
+            self.assertLessEqual(len(program), len(plain.compile(expression)))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                np.testing.assert_array_equal(optimized.evaluate(expression, x=x, y=y),
+                                              plain.evaluate(expression, x=x, y=y))
+                # assert_equal, as nan != nan
+                np.testing.assert_equal(optimized.evaluate(expression, x=0.5, y=2),
+                                        plain.evaluate(expression, x=0.5, y=2))
+
+class TestProgram(unittest.TestCase):
+    def test_same_as_eval_rpn(self):
+        c = Calculator(optimize=False)
+        x = np.linspace(0.1, 2, 100)
+        for expression in TestOptimize.expressions:
+            rpn = c.shunting_yard(c.tokens(expression))
+            np.testing.assert_array_equal(Program(rpn)({'x': x, 'y': 2}), c.eval_rpn(rpn, {'x': x, 'y': 2}))
+
+    def test_stack_depth(self):
+        c = Calculator(optimize=False)
+        program = c.compile('1 + 2 * (3 + 4 * 5)')
+        self.assertEqual(program.depth, 5)
+        self.assertEqual(program(), 47)
+
+    def test_more_temporaries_than_depth(self):
+        c = Calculator()
+        expression = '(a+b)+(a+b)+(c+d)+(c+d)+(e+f)+(e+f)+(g+h)+(g+h)'
+        values = dict(zip('abcdefgh', range(1, 9)))
+        program = c.compile(expression)
+        self.assertGreater(program.temporaries, program.depth)
+        self.assertEqual(c.evaluate(expression, **values), 72)
+        self.assertEqual(c.evaluate(expression, **values), 72)
+
+    def test_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+        c = Calculator()
+        x = np.linspace(0.1, 2, 10000)
+        expected = c.evaluate('sin(x) * sin(x) + cos(x) * cos(x) + x', x=x)
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda i: c.evaluate('sin(x) * sin(x) + cos(x) * cos(x) + x', x=x + i),
+                                        range(50)))
+        for i, result in enumerate(results):
+            np.testing.assert_array_equal(result, expected + i if False else c.eval_rpn(
+                c.shunting_yard(c.tokens('sin(x) * sin(x) + cos(x) * cos(x) + x')), {'x': x + i}))
+
+    def test_unbound(self):
+        with self.assertRaises(NameError):
+            Calculator().compile('x + y')({'x': 1})
+
+class TestScanner(unittest.TestCase):
+    def test_numbers(self):
+        c = Calculator()
+        self.assertEqual(list(c.tokens('1.5e3+.5*2E-2/3.')),
+                         [1500, c.operators['+'], 0.5, c.operators['*'], 0.02, c.operators['/'], 3])
+
+    def test_negative(self):
+        c = Calculator()
+        self.assertEqual(list(c.tokens('-3*-2e1')), [-3, c.operators['*'], -20])
+        self.assertEqual(list(c.tokens('2 - 3')), [2, c.operators['-'], 3])
+        self.assertEqual(c.evaluate('-(1 + 2) * -x - -exp(0)', x=2), 7)
+
+    def test_no_output(self):
+        import io
+        from contextlib import redirect_stdout
+        c = Calculator()
+        out = io.StringIO()
+        with redirect_stdout(out):
+            list(c.tokens('exp(sin(x) + cos(y))'))
+        self.assertEqual(out.getvalue(), '')
+
+    def test_errors(self):
+        c = Calculator()
+        errors = {'1 + * 2': 4, '1 2': 2, '(1 + 2': 0, '1 + 2)': 5, '1 # 2': 2, '1 +': 3, '2(3)': 1, '1e': 1}
+        for expression, position in errors.items():
+            with self.assertRaises(ParseError) as cm:
+                list(c.tokens(expression))
+            self.assertEqual(cm.exception.position, position)
+
+    def test_evaluate_errors(self):
+        c = Calculator()
+        errors = {'1  +  $': 6, '1+2)': 3, '  (1 +  2': 2, '1 +  2  3': 8}
+        for expression, position in errors.items():
+            with self.assertRaises(ParseError) as cm:
+                c.evaluate(expression)
+            self.assertEqual(cm.exception.position, position)
+        c.evaluate('1 +  2  *  3')
+        with self.assertRaises(ParseError) as cm:
+            c.evaluate('1+2*3 $')
+        self.assertEqual(cm.exception.position, 6)
+
+    def test_cache_key(self):
+        c = Calculator()
+        self.assertIs(c.compile('2*x'), c.compile('2 * x'))
+        self.assertIsNot(c.compile('12 * x'), c.compile('1 * 2 * x'))
+
 if __name__ == '__main__':
     unittest.main()
@@ -8,12 +8,34 @@
 Program implementing various cyphers.
 """
 
-from random import randint
+from random import randint, randrange, getrandbits
+from bisect import bisect_left
+from functools import lru_cache, reduce
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from sys import stderr
+import codecs
+import collections
+import hashlib
 import itertools
+import json
 import math
+import mmap
+import multiprocessing
+import os
+import queue
+import random
+import re
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+from crypto_stats import Profiler
 
 # Not included in this project
-from crypto_utils import modular_inverse, generate_random_prime
+from crypto_utils import modular_inverse
 
 
 def words(text: str):
@@ -26,7 +48,7 @@ def primes(bits=1024):
     """Helper function that returns a prime generator
     with a set number of bits"""
     while True:
-        yield generate_random_prime(bits)
+        yield random_prime(bits)
 
 
 def first(lst):
@@ -46,6 +68,58 @@ def randints(start=0, end=1024, limit=None):
         yield randint(start, end - 1)
 
 
+def chunked(iterable, size):
+    """Generator that yields lists of (at most) size elements from iterable"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_chunks(source, size=1 << 20):
+    """Generator that yields chunks of a string, an iterable of strings or a
+    file object, without reading the whole file object into memory"""
+    if isinstance(source, (str, bytes)):
+        yield source
+    elif hasattr(source, 'read'):
+        yield from iter(lambda: source.read(size), source.read(0))
+    else:
+        yield from source
+
+
+def text_chunks(source, size=1 << 20):
+    """Same as read_chunks, but bytes are decoded as utf-8, also when a
+    character is split between two chunks"""
+    decoder = codecs.getincrementaldecoder('utf_8')()
+    for chunk in read_chunks(source, size):
+        yield decoder.decode(chunk) if isinstance(chunk, bytes) else chunk
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def data_chunks(source, size=1 << 20):
+    """Same as read_chunks, but strings are encoded as utf-8"""
+    for chunk in read_chunks(source, size):
+        yield chunk.encode('utf_8') if isinstance(chunk, str) else chunk
+
+
+def fixed_chunks(chunks, size: int):
+    """Generator that re-chunks an iterable of strings (or bytes) into
+    chunks of size elements, only the last one can be shorter"""
+    buffer = None
+    for chunk in chunks:
+        buffer = chunk if buffer is None else buffer + chunk
+        full = len(buffer) - len(buffer) % size
+        for start in range(0, full, size):
+            yield buffer[start:start + size]
+        buffer = buffer[full:]
+    if buffer:
+        yield buffer
+
+
 def repeatedstr(str_):
     """Generator that repeates the string s forever"""
     saved = [s for s in str_]
@@ -56,21 +130,197 @@ def repeatedstr(str_):
         i = (i + 1) % len(saved)
 
 
+class Alphabet(tuple):
+    """The characters of a cipher, with O(1) lookup of the index of a
+    character. The index in a contiguous alphabet (a range of code points,
+    like PRINTABLE) is ord(c) - ord(alphabet[0]), and characters outside of
+    it are wrapped into it. Other alphabets use a dict, and a code point
+    indexed array for numpy; characters outside of them are not encoded."""
+
+    def __new__(cls, chars):
+        alphabet = super().__new__(cls, chars)
+        if not alphabet:
+            raise ValueError('Empty alphabet')
+        alphabet.text = "".join(alphabet)
+        alphabet.base = ord(alphabet[0])
+        alphabet.indices = {c: i for i, c in enumerate(alphabet)}
+        if len(alphabet.indices) != len(alphabet) or len(alphabet.text) != len(alphabet):
+            raise ValueError('Alphabet characters must be distinct single characters')
+        alphabet.codes = np.fromiter(map(ord, alphabet), dtype=np.uint32, count=len(alphabet))
+        alphabet.contiguous = all(map(lambda x: ord(x[1]) - alphabet.base == x[0], enumerate(alphabet)))
+        alphabet.table = None
+        if not alphabet.contiguous:
+            # One element past the largest code point, for all characters outside
+            alphabet.table = np.full(max(map(ord, alphabet)) + 2, -1, dtype=np.int64)
+            alphabet.table[alphabet.codes] = np.arange(len(alphabet))
+        return alphabet
+
+    def index_of(self, chr_: str):
+        """Returns the index of chr_, or None if it is not encoded"""
+        if self.contiguous:
+            return (ord(chr_) - self.base) % len(self)
+        return self.indices.get(chr_)
+
+    def indices_of(self, codes):
+        """Vectorized index_of of a numpy array of code points, returns a new
+        int64 array where characters that are not encoded are -1"""
+        if self.contiguous:
+            return np.mod(codes.astype(np.int64) - self.base, len(self))
+        return self.table[np.minimum(codes, len(self.table) - 1)]
+
+
+def as_alphabet(chars):
+    """Returns chars as an Alphabet"""
+    return chars if isinstance(chars, Alphabet) else Alphabet(chars)
+
+
+PRINTABLE = Alphabet(map(chr, range(32, 127)))  # [#32, ..., #126]
+UPPERCASE = Alphabet(map(chr, range(ord('A'), ord('Z') + 1)))
+BASE64 = Alphabet('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/')
+
+
 def cipher_(func, chr_, alphabet):
     """Helper function for transformation functions"""
-    return alphabet[func(ord(chr_) - ord(alphabet[0])) % len(alphabet)]
+    alphabet = as_alphabet(alphabet)
+    index = alphabet.index_of(chr_)
+    if index is None:
+        return chr_
+    return alphabet[func(index) % len(alphabet)]
+
+
+class TranslationTable(dict):
+    """str.translate table for the transformation t -> a*t + b over alphabet.
+    Characters outside of the alphabet are handled the same way cipher_ does,
+    and are added to the table the first time they are seen."""
+
+    def __init__(self, alphabet: str, a: int, b: int):
+        self.alphabet = Alphabet(alphabet)
+        self.a = a
+        self.b = b
+        super().__init__(str.maketrans(alphabet, "".join(
+            map(lambda x: cipher_(lambda t: a * t + b, x, self.alphabet), alphabet))))
+
+    def __missing__(self, ordinal: int):
+        mapped = ord(cipher_(lambda t: self.a * t + self.b, chr(ordinal), self.alphabet))
+        self[ordinal] = mapped
+        return mapped
+
+
+@lru_cache(maxsize=1024)
+def translation_table(alphabet: str, a: int, b: int):
+    """Returns the (cached) translation table for t -> a*t + b over alphabet"""
+    return TranslationTable(alphabet, a, b)
+
+
+def split_lengths(joined, lengths):
+    """Split joined into consecutive pieces of the given lengths"""
+    ends = list(itertools.accumulate(lengths))
+    return list(map(lambda x: joined[x[0]:x[1]], zip([0] + ends, ends)))
+
+
+class KeyProduct:
+    """Lazy equivalent of itertools.product over sequences: the i'th key is
+    computed from i, the last sequence varies the fastest"""
+
+    def __init__(self, *sequences):
+        self.sequences = sequences
+
+    def __len__(self):
+        return reduce(lambda a, b: a * b, map(len, self.sequences), 1)
+
+    def __getitem__(self, i: int):
+        i = range(len(self))[i]
+        key = []
+        for sequence in reversed(self.sequences):
+            i, j = divmod(i, len(sequence))
+            key.append(sequence[j])
+        return tuple(reversed(key))
+
+
+class KeySpace:
+    """Lazy, indexable set of keys of known size, backed by a sequence
+    (a range, a tuple, a KeyProduct or a Wordlist). A key space can be split
+    into disjoint shards, and resumed from a position (see save_checkpoint),
+    so that a brute force search can be split across processes or machines
+    and restarted."""
+
+    def __init__(self, keys, indices=None):
+        self.keys = keys
+        self.indices = range(len(keys)) if indices is None else indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def key_at(self, i: int):
+        """Returns the i'th key, in O(1)"""
+        return self.keys[self.indices[i]]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return KeySpace(self.keys, self.indices[i])
+        return self.key_at(i)
+
+    def __iter__(self):
+        return map(self.keys.__getitem__, self.indices)
+
+    def shard(self, i: int, n: int):
+        """Returns shard i of n (almost) equally sized disjoint shards"""
+        if not 0 <= i < n:
+            raise ValueError('Shard {} of {} does not exist'.format(i, n))
+        return self[len(self) * i // n:len(self) * (i + 1) // n]
+
+    def resume(self, position: int):
+        """Returns the keys from position onwards"""
+        return self[position:]
+
+    def chunk_ranges(self, size: int, position=0):
+        """Generator that yields the ranges of positions of chunks of size
+        keys, starting at position"""
+        return map(lambda start: range(start, min(start + size, len(self))),
+                   range(position, len(self), size))
+
+
+def save_checkpoint(path: str, keys, position: int):
+    """Record that the keys before position have been checked. The file is
+    replaced atomically, so an interrupted search can always be resumed"""
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'size': len(keys), 'position': position}, f)
+    os.replace(path + '.tmp', path)
+
+
+def load_checkpoint(path: str, keys):
+    """Returns the position recorded by save_checkpoint, or 0 if there is
+    no checkpoint"""
+    if path is None or not os.path.exists(path):
+        return 0
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint['size'] != len(keys):
+        raise ValueError('Checkpoint {} is for a different key space'.format(path))
+    return checkpoint['position']
 
 
 class Cipher:
     """Cipher >> Cypher"""
 
-    def __init__(self):
-        self.alphabet = [chr(i) for i in range(32, 127)]  # [#32, ..., #126]
+    # The encoding and decoding are affine maps, see encode_params
+    translatable = False
+
+    def __init__(self, fast=True, alphabet=PRINTABLE):
+        self.alphabet = alphabet
+        # Use the table based/vectorized implementations instead of
+        # calling cipher_ once per character
+        self.fast = fast
 
-        # A-Z
-        # self.alphabet = [
-        #    chr(i) for i in range(ord("A"), ord("Z") + 1)
-        # ]  # [#32, ..., #126]
+    @property
+    def alphabet(self):
+        """The Alphabet of the cipher, any sequence of characters can be
+        assigned, like UPPERCASE, BASE64 or a unicode block"""
+        return self._alphabet
+
+    @alphabet.setter
+    def alphabet(self, chars):
+        self._alphabet = as_alphabet(chars)
 
     def encode(self, input_str: str, key):
         """Encode string input_str"""
@@ -82,19 +332,85 @@ class Cipher:
         """Verify that the encoding-decoding pair works correctly"""
         assert self.decode(self.encode(input_str, key), key) == input_str
 
+    def encode_batch(self, messages: list, key, **kwargs):
+        """Encode a list of messages with the same key. The per-key setup
+        is done once for the whole batch where possible"""
+        if self.fast and self.translatable:
+            return split_lengths(self.transform("".join(messages), *self.encode_params(key)),
+                                 map(len, messages))
+        return list(map(lambda m: self.encode(m, key, **kwargs), messages))
+
+    def decode_batch(self, messages: list, key, **kwargs):
+        """Decode a list of messages with the same key, see encode_batch"""
+        if self.fast and self.translatable:
+            return split_lengths(self.transform("".join(messages), *self.decode_params(key)),
+                                 map(len, messages))
+        return list(map(lambda m: self.decode(m, key, **kwargs), messages))
+
+    def encode_at(self, input_str: str, key, position: int, **kwargs):
+        """Encode input_str, which starts at position in the whole text"""
+        return self.encode(input_str, key, **kwargs)
+
+    def decode_at(self, enc_str: str, key, position: int, **kwargs):
+        """Decode enc_str, which starts at position in the whole text"""
+        return self.decode(enc_str, key, **kwargs)
+
+    def encode_stream(self, source, key, **kwargs):
+        """Encode source one chunk at a time, see text_chunks.
+        Yields the encoded chunks"""
+        return self.position_stream(self.encode_at, source, key, **kwargs)
+
+    def decode_stream(self, source, key, **kwargs):
+        """Decode source one chunk at a time, see text_chunks.
+        Yields the decoded chunks"""
+        return self.position_stream(self.decode_at, source, key, **kwargs)
+
+    @staticmethod
+    def position_stream(func, source, key, **kwargs):
+        """Apply func to every chunk and its position in the stream"""
+        position = 0
+        for chunk in text_chunks(source):
+            yield func(chunk, key, position, **kwargs)
+            position += len(chunk)
+
     def generate_keys(self):
         """Generates the keys distributed to both sender and reciever
            Returns: (sender_key, reciever_key)"""
 
     def possible_keys(self):
-        """Generator returning all possible keys"""
+        """Returns the KeySpace of all possible keys"""
+
+    def encode_params(self, key):
+        """Returns (a, b) such that encoding with key maps the alphabet index
+        t to a*t + b, for ciphers where that is possible"""
+        raise NotImplementedError
+
+    def decode_params(self, key):
+        """Same as encode_params, for decoding"""
+        raise NotImplementedError
+
+    def table(self, a: int, b: int):
+        """Returns the translation table for t -> a*t + b over self.alphabet"""
+        return translation_table(self.alphabet.text, a, b)
+
+    def transform(self, text: str, a: int, b: int):
+        """Returns text with t -> a*t + b applied to the alphabet indices.
+        str.translate is slow for strings that are not latin-1, so they are
+        transformed with numpy instead"""
+        if text.isascii():
+            return text.translate(self.table(a, b))
+        return affine(text, a, b, self.alphabet)
 
 
 class Caesar(Cipher):
     """Caesar chipher impl."""
 
+    translatable = True
+
     def encode(self, input_str: str, key: int):
         """Encode string input_str"""
+        if self.fast:
+            return self.transform(input_str, *self.encode_params(key))
         return "".join(
             map(lambda x: cipher_(lambda t: t + key, x, self.alphabet), input_str)
         )
@@ -107,62 +423,148 @@ class Caesar(Cipher):
         """Verify that the encoding-decoding pair works correctly"""
         assert self.decode(self.encode(input_str, key), key) == input_str
 
+    def encode_params(self, key: int):
+        """Encoding maps t to t + key"""
+        return (1, key)
+
+    def decode_params(self, key: int):
+        """Decoding maps t to t - key"""
+        return (1, -key)
+
     def generate_keys(self):
         """Generates the keys distributed to both sender and reciever"""
         return [randint(0, len(self.alphabet) - 1)] * 2
 
     def possible_keys(self):
         """Return all possible keys"""
-        return itertools.takewhile(lambda x: x < len(self.alphabet), itertools.count())
+        return KeySpace(range(len(self.alphabet)))
+
+
+@lru_cache(maxsize=None)
+def multiplicative_table(n: int):
+    """Returns the valid multiplicative keys modulo n (gcd(key, n) == 1),
+    and modular_inverse(key, n) of every 0 <= key < n"""
+    keys = tuple(filter(lambda x: math.gcd(x, n) == 1, range(n)))
+    return keys, tuple(map(lambda x: modular_inverse(x, n), range(n)))
+
+
+class AffineSchedule:
+    """All Affine keys (a, b) modulo n, in the order of Affine.possible_keys.
+    Like KeyProduct, the keys are computed from their index when they are
+    needed, so only the multiplicative keys are stored"""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.keys = np.array(multiplicative_table(n)[0], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.keys) * self.n
+
+    def __getitem__(self, i: int):
+        a, b = divmod(range(len(self))[i], self.n)
+        return int(self.keys[a]), b
+
+    def rows(self, start=0, stop=None):
+        """Returns the keys in range(start, stop) as a (number of keys, 2)
+        array of (a, b)"""
+        indices = np.arange(*slice(start, stop).indices(len(self)), dtype=np.int64)
+        return np.stack([self.keys[indices // self.n], indices % self.n], axis=1)
+
+
+@lru_cache(maxsize=None)
+def affine_schedule(n: int):
+    """Returns the (shared) AffineSchedule of the keys modulo n"""
+    return AffineSchedule(n)
 
 
 class Multiplicative(Cipher):
     """Multiplicative chipher impl."""
 
+    translatable = True
+
+    @Cipher.alphabet.setter
+    def alphabet(self, chars):
+        self._alphabet = as_alphabet(chars)
+        # Shared by all instances with the same alphabet size
+        self.keys, self.inverses = multiplicative_table(len(self._alphabet))
+
+    def inverse(self, key: int):
+        """Table lookup of modular_inverse(key, len(alphabet))"""
+        return self.inverses[key % len(self.alphabet)]
+
     def encode(self, input_str: str, key: int):
         """Encode string input_str"""
+        if self.fast:
+            return self.transform(input_str, *self.encode_params(key))
         return "".join(
             map(lambda x: cipher_(lambda t: t * key, x, self.alphabet), input_str)
         )
 
     def decode(self, enc_str: str, key: int):
         """Decode an encoded string enc_str"""
-        inv = modular_inverse(key, len(self.alphabet))
+        if self.fast:
+            return self.transform(enc_str, *self.decode_params(key))
+        inv = self.inverse(key)
         return "".join(
             map(lambda x: cipher_(lambda t: t * inv, x, self.alphabet), enc_str)
         )
 
+    def encode_params(self, key: int):
+        """Encoding maps t to key*t"""
+        return (key, 0)
+
+    def decode_params(self, key: int):
+        """Decoding maps t to inv*t, where inv is the inverse of key"""
+        return (self.inverse(key), 0)
+
     def generate_keys(self):
         """Generates the keys distributed to both sender and reciever"""
-        return [
-            first(
-                filter(
-                    lambda x: math.gcd(x, len(self.alphabet)) == 1,
-                    randints(end=len(self.alphabet)),
-                )
-            )
-        ] * 2
+        return [random.choice(self.keys)] * 2
 
     def possible_keys(self):
         """Return all possible keys: gcd(key, len(alphabet) != 1"""
-        return filter(lambda x: math.gcd(x, len(self.alphabet)) == 1,
-                      itertools.takewhile(lambda x: x < len(self.alphabet), itertools.count()))
+        return KeySpace(self.keys)
 
 
 class Affine(Cipher):
     """Affine chipher impl."""
 
-    def __init__(self):
-        super().__init__()
-        self.caesar = Caesar()
-        self.multiplicative = Multiplicative()
+    translatable = True
+
+    def __init__(self, fast=True, alphabet=PRINTABLE):
+        # alphabet may be an iterator, which can only be consumed once
+        alphabet = as_alphabet(alphabet)
+        self.caesar = Caesar(fast=fast, alphabet=alphabet)
+        self.multiplicative = Multiplicative(fast=fast, alphabet=alphabet)
+        super().__init__(fast=fast, alphabet=alphabet)
+
+    @Cipher.alphabet.setter
+    def alphabet(self, chars):
+        self._alphabet = self.caesar.alphabet = self.multiplicative.alphabet = as_alphabet(chars)
+        # Every key (a, b), see affine_schedule
+        self.schedule = affine_schedule(len(self._alphabet))
 
     def encode(self, input_str: str, key: (int, int)):
+        """Encode string input_str"""
+        if self.fast:
+            return self.transform(input_str, *self.encode_params(key))
         return self.caesar.encode(self.multiplicative.encode(input_str, key[0]), key[1])
 
     def decode(self, input_str: str, key: (int, int)):
+        """Decode an encoded string input_str"""
+        if self.fast:
+            return self.transform(input_str, *self.decode_params(key))
         return self.multiplicative.decode(self.caesar.decode(input_str, key[1]), key[0])
 
+    def encode_params(self, key: (int, int)):
+        """caesar(multiplicative(t)) = a*t + b"""
+        return key
+
+    def decode_params(self, key: (int, int)):
+        """multiplicative^-1(caesar^-1(t)) = inv*(t - b) = inv*t - inv*b"""
+        inv = self.multiplicative.inverse(key[0])
+        return (inv, -inv * key[1])
+
     def generate_keys(self):
         """Generates the keys distributed to both sender and reciever"""
         return [
@@ -174,7 +576,237 @@ class Affine(Cipher):
 
     def possible_keys(self):
         """Return all possible keys: gcd(key, len(alphabet) != 1"""
-        return itertools.product(self.multiplicative.possible_keys(), self.caesar.possible_keys())
+        return KeySpace(KeyProduct(self.multiplicative.possible_keys(), self.caesar.possible_keys()))
+
+
+def codepoints(text: str):
+    """Returns the code points of text as a numpy array"""
+    if text.isascii():
+        return np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+    return np.frombuffer(text.encode('utf_32_le'), dtype=np.uint32)
+
+
+def from_codepoints(arr):
+    """Inverse of codepoints"""
+    if arr.size and arr.max() < 128:
+        return arr.astype(np.uint8).tobytes().decode('ascii')
+    return arr.astype(np.uint32).tobytes().decode('utf_32_le')
+
+
+def vigenere_shifts(key: str, alphabet, sign=1):
+    """Returns the alphabet index offset of each character in key
+    (negated when sign=-1)"""
+    # cipher_ computes alphabet[(index_of(c) +- ord(k)) % n]
+    return np.mod(sign * np.fromiter(map(ord, key), dtype=np.int64, count=len(key)), len(alphabet))
+
+
+def alphabet_lookup(codes, indices, outside, alphabet):
+    """Returns the code points of the alphabet indices, the characters that
+    are not encoded (outside, None for contiguous alphabets) keep their
+    code points codes"""
+    encoded = alphabet.codes[np.mod(indices, len(alphabet), out=indices)]
+    return encoded if outside is None else np.where(outside, codes, encoded)
+
+
+def affine(text: str, a: int, b: int, alphabet):
+    """Vectorized equivalent of applying cipher_ with t -> a*t + b to
+    every character of text"""
+    alphabet = as_alphabet(alphabet)
+    codes = codepoints(text)
+    indices = alphabet.indices_of(codes)
+    outside = None if alphabet.contiguous else indices < 0
+    indices *= a
+    indices += b
+    return from_codepoints(alphabet_lookup(codes, indices, outside, alphabet))
+
+
+def vigenere(text: str, key: str, alphabet, sign=1, chunk_size=1 << 20):
+    """Vectorized equivalent of Unbreakable.encode (sign=1) and
+    Unbreakable.decode (sign=-1). The text is processed in chunks of about
+    chunk_size characters to keep the temporary arrays small."""
+    alphabet = as_alphabet(alphabet)
+    shifts = vigenere_shifts(key, alphabet, sign)
+
+    # Every chunk starts at the beginning of the key, so that the key offsets
+    # can be broadcast over the rows of a (-1, len(key)) view of the chunk
+    chunk_size = max(chunk_size // len(shifts), 1) * len(shifts)
+    chunks = []
+    for start in range(0, len(text), chunk_size):
+        codes = codepoints(text[start:start + chunk_size])
+        indices = alphabet.indices_of(codes)
+        outside = None if alphabet.contiguous else indices < 0
+        full = len(codes) - len(codes) % len(shifts)
+        rows = indices[:full].reshape(-1, len(shifts))
+        rows += shifts
+        indices[full:] += shifts[:len(codes) - full]
+        chunks.append(from_codepoints(alphabet_lookup(codes, indices, outside, alphabet)))
+    return "".join(chunks)
+
+
+def vigenere_batch(messages: list, key: str, alphabet, sign=1):
+    """Vectorized equivalent of vigenere over a list of messages, the key
+    restarts at the beginning of every message"""
+    alphabet = as_alphabet(alphabet)
+    shifts = vigenere_shifts(key, alphabet, sign)
+    lengths = np.fromiter(map(len, messages), dtype=np.int64, count=len(messages))
+    codes = codepoints("".join(messages))
+    # The position of every character within its message
+    positions = np.arange(len(codes)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    indices = alphabet.indices_of(codes)
+    outside = None if alphabet.contiguous else indices < 0
+    indices += shifts[positions % len(shifts)]
+    return split_lengths(from_codepoints(alphabet_lookup(codes, indices, outside, alphabet))
+                         if len(codes) else "", lengths)
+
+
+class Wordlist:
+    """Read-only set of words backed by a memory-mapped index file, so that no
+    Python object is created per word. The index contains a bloom filter,
+    which rejects most words that are not in the list without touching the
+    words themselves, followed by the sorted words and their offsets, which
+    are binary searched.
+
+    Layout (little endian): magic, number of words, bloom filter bits,
+    bloom filter hashes (4 x 8 bytes), the bloom filter (padded to 8 bytes),
+    number of words + 1 uint64 offsets into the utf-8 encoded words."""
+
+    MAGIC = b'WORDIDX1'
+    HEADER = struct.Struct('<8sQQQ')
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.bloom_bits, self.hashes = self.HEADER.unpack_from(self.mm)
+        if magic != self.MAGIC:
+            raise ValueError('{} is not a wordlist index'.format(path))
+        self.bloom_start = self.HEADER.size
+        offsets_start = self.bloom_start + -(-self.bloom_bits // 64) * 8
+        self.offsets = np.frombuffer(self.mm, dtype='<u8', count=self.count + 1,
+                                     offset=offsets_start)
+        self.words_start = offsets_start + (self.count + 1) * 8
+
+    def __getstate__(self):
+        return self.path
+
+    def __setstate__(self, path):
+        self.__init__(path)
+
+    @staticmethod
+    def bloom_hashes(word: bytes):
+        """Returns the two 64 bit hashes used for double hashing"""
+        digest = hashlib.blake2b(word, digest_size=16).digest()
+        return struct.unpack('<QQ', digest)
+
+    @classmethod
+    def build(cls, words, path: str, bits_per_word=10, hashes=7):
+        """Write the index of the words in the iterable words to path. The
+        file is replaced atomically, so a process that loads it at the same
+        time, or an interrupted build, never sees a partial index"""
+        encoded = sorted(set(filter(None, map(lambda w: w.strip().encode('utf_8'), words))))
+        bloom_bits = max(len(encoded) * bits_per_word, 64)
+
+        bloom = np.zeros(-(-bloom_bits // 64) * 8, dtype=np.uint8)
+        if encoded:
+            h1, h2 = np.array(list(map(cls.bloom_hashes, encoded)), dtype=np.uint64).T
+            positions = (h1[:, None] + np.arange(hashes, dtype=np.uint64) * h2[:, None]) \
+                % np.uint64(bloom_bits)
+            np.bitwise_or.at(bloom, positions >> np.uint64(3),
+                             np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+
+        offsets = np.zeros(len(encoded) + 1, dtype='<u8')
+        offsets[1:] = np.cumsum(list(map(len, encoded)))
+        # One temporary file per process, for concurrent builds
+        temporary = '{}.{}.tmp'.format(path, os.getpid())
+        try:
+            with open(temporary, 'wb') as f:
+                f.write(cls.HEADER.pack(cls.MAGIC, len(encoded), bloom_bits, hashes))
+                f.write(bloom.tobytes())
+                f.write(offsets.tobytes())
+                f.write(b''.join(encoded))
+            os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    def word(self, i: int):
+        """Returns the (utf-8 encoded) i'th word in sorted order"""
+        return self.mm[self.words_start + int(self.offsets[i]):
+                       self.words_start + int(self.offsets[i + 1])]
+
+    def might_contain(self, word: bytes):
+        """Bloom filter lookup, false positives are possible"""
+        h1, h2 = self.bloom_hashes(word)
+        positions = map(lambda i: (h1 + i * h2) % (1 << 64) % self.bloom_bits, range(self.hashes))
+        return all(map(lambda p: self.mm[self.bloom_start + (p >> 3)] & (1 << (p & 7)), positions))
+
+    def __contains__(self, word):
+        encoded = word.encode('utf_8') if isinstance(word, str) else word
+        if not self.might_contain(encoded):
+            return False
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.word(mid) < encoded:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < self.count and self.word(lo) == encoded
+
+    @property
+    def longest(self):
+        """Length of the longest (utf-8 encoded) word"""
+        return int(np.diff(self.offsets).max()) if self.count else 0
+
+    def has_prefix(self, prefix: str):
+        """Check if prefix is the prefix of a word"""
+        encoded = prefix.encode('utf_8')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.word(mid) < encoded:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < self.count and self.word(lo).startswith(encoded)
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i: int):
+        return self.word(range(self.count)[i]).decode('utf_8')
+
+    def __iter__(self):
+        return map(lambda i: self.word(i).decode('utf_8'), range(self.count))
+
+
+class WordPrefixes:
+    """Prefix lookups in a set of words, by binary search of the sorted
+    words. A Wordlist supports the same lookups itself"""
+
+    def __init__(self, words):
+        self.words = sorted(words)
+        self.longest = max(map(len, self.words), default=0)
+
+    def has_prefix(self, prefix: str):
+        """Check if prefix is the prefix of a word"""
+        i = bisect_left(self.words, prefix)
+        return i < len(self.words) and self.words[i].startswith(prefix)
+
+
+def word_prefixes(wordlist):
+    """Returns the prefix lookups (see WordPrefixes) of wordlist"""
+    return wordlist if isinstance(wordlist, Wordlist) else WordPrefixes(wordlist)
+
+
+def load_wordlist(path: str):
+    """Returns the Wordlist of the text file path (one word per line). The
+    index is built the first time, and stored in path + '.idx'"""
+    index = path + '.idx'
+    if not os.path.exists(index) or os.path.getmtime(index) < os.path.getmtime(path):
+        with open(path) as f:
+            Wordlist.build(f, index)
+    return Wordlist(index)
 
 
 class Unbreakable(Cipher):
@@ -182,6 +814,8 @@ class Unbreakable(Cipher):
 
     def encode(self, input_str: str, key: int):
         """Encode string input_str"""
+        if self.fast:
+            return vigenere(input_str, key, self.alphabet)
         return "".join(
             map(
                 lambda x: cipher_(
@@ -192,6 +826,8 @@ class Unbreakable(Cipher):
 
     def decode(self, input_str: str, key: str):
         """Decode """
+        if self.fast:
+            return vigenere(input_str, key, self.alphabet, sign=-1)
         return "".join(
             map(
                 lambda x: cipher_(
@@ -200,26 +836,50 @@ class Unbreakable(Cipher):
             )
         )
 
+    def encode_batch(self, messages: list, key: str):
+        """Encode a list of messages with the same key"""
+        if self.fast:
+            return vigenere_batch(messages, key, self.alphabet)
+        return super().encode_batch(messages, key)
+
+    def decode_batch(self, messages: list, key: str):
+        """Decode a list of messages with the same key"""
+        if self.fast:
+            return vigenere_batch(messages, key, self.alphabet, sign=-1)
+        return super().decode_batch(messages, key)
+
+    def encode_at(self, input_str: str, key: str, position: int):
+        """Encode input_str, with the key rotated to position"""
+        offset = position % len(key)
+        return self.encode(input_str, key[offset:] + key[:offset])
+
+    def decode_at(self, enc_str: str, key: str, position: int):
+        """Decode enc_str, with the key rotated to position"""
+        offset = position % len(key)
+        return self.decode(enc_str, key[offset:] + key[:offset])
+
     def generate_keys(self, limit=10):
         """Generates the keys distributed to both sender and reciever"""
         return [
             "".join(
                 map(
-                    lambda x: cipher_(lambda t: t, x, self.alphabet),
-                    map(chr, randints(start=0, end=len(self.alphabet), limit=limit)),
+                    lambda i: self.alphabet[i],
+                    randints(start=0, end=len(self.alphabet), limit=limit),
                 )
             )
         ] * 2
 
     def possible_keys(self):
         """All possible keys: the language generated by self.alphabet"""
-        # This is not feasable
-        with open('english_words.txt') as f:
-            return map(lambda s: s.strip(), f.readlines())
+        # This is not feasable, use only the words in english_words.txt
+        return KeySpace(load_wordlist('english_words.txt'))
 
 
 def text_to_int_blocks(text, block_size=1024):
-    data = text.encode('utf_8')
+    return bytes_to_int_blocks(text.encode('utf_8'), block_size)
+
+
+def bytes_to_int_blocks(data, block_size=1024):
     return map(lambda c: int.from_bytes(data[c:min(c+block_size, len(data))], 'big', signed=False),
                range(0, len(data), block_size))
 
@@ -230,28 +890,329 @@ def int_blocks_to_text(blocks, block_size=1024):
                        .lstrip('\0'), blocks))
 
 
+def packed_block_size(n: int):
+    """Returns the number of data bytes per block for packed blocks with
+    modulus n: the data and its sentinel byte must be smaller than n"""
+    return (n.bit_length() - 1) // 8 - 1
+
+
+def bytes_to_packed_blocks(data, block_size: int):
+    """Generator that packs data into int blocks without copying it. Every
+    block is prefixed by a sentinel 1 byte, which preserves leading zero
+    bytes and gives the exact length of the (last) block"""
+    view = memoryview(data).cast('B')
+    for start in range(0, len(view), block_size):
+        block = view[start:start + block_size]
+        yield int.from_bytes(block, 'big') | (1 << (8 * len(block)))
+
+
+def packed_blocks_to_bytes(blocks):
+    """Inverse of bytes_to_packed_blocks. The blocks are reassembled into
+    one preallocated bytearray"""
+    blocks = list(blocks)
+    lengths = list(map(lambda block: (block.bit_length() - 1) // 8, blocks))
+    data = bytearray(sum(lengths))
+    position = 0
+    for block, length in zip(blocks, lengths):
+        data[position:position + length] = (block ^ (1 << (8 * length))).to_bytes(length, 'big')
+        position += length
+    return data
+
+
+def small_primes(limit: int):
+    """Returns the primes below limit (sieve of Eratosthenes)"""
+    is_prime = np.ones(limit, dtype=bool)
+    is_prime[:2] = False
+    for i in range(2, int(limit ** 0.5) + 1):
+        if is_prime[i]:
+            is_prime[i * i::i] = False
+    return list(map(int, np.flatnonzero(is_prime)))
+
+
+SMALL_PRIMES = small_primes(2000)
+
+
+def miller_rabin(n: int, rounds=40):
+    """Miller-Rabin probabilistic primality test of the odd number n > 4"""
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d, s = d // 2, s + 1
+    for _ in range(rounds):
+        x = pow(randrange(2, n - 1), d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def is_probable_prime(n: int, rounds=40):
+    """Trial division by SMALL_PRIMES followed by Miller-Rabin"""
+    if n < 2:
+        return False
+    for p in SMALL_PRIMES:
+        if n % p == 0:
+            return n == p
+    return miller_rabin(n, rounds)
+
+
+def random_prime(bits=1024, window=4096, windows=None):
+    """Returns a random prime with the given number of bits. The odd numbers
+    in a window after a random starting point are sieved with SMALL_PRIMES,
+    and only the survivors are tested with Miller-Rabin.
+    Returns None if no prime was found in windows windows (if set)"""
+    if bits < 16:
+        return first(filter(is_probable_prime, randints(1 << (bits - 1), 1 << bits)))
+
+    for _ in itertools.repeat(None, windows) if windows else itertools.count():
+        start = getrandbits(bits) | (1 << (bits - 1)) | 1
+        composite = np.zeros(window, dtype=bool)  # composite[k]: start + 2k
+        for p in SMALL_PRIMES[1:]:
+            # start + 2k = 0 (mod p) <=> k = -start * inv(2) (mod p)
+            composite[-start * ((p + 1) // 2) % p::p] = True
+        for k in np.flatnonzero(~composite):
+            candidate = start + 2 * int(k)
+            if candidate.bit_length() == bits and miller_rabin(candidate):
+                return candidate
+    return None
+
+
+def _prime_search(bits, windows):
+    """Process pool task for generate_primes"""
+    # Forked workers share the random state of the parent, reseed from the OS
+    random.seed()
+    return random_prime(bits, windows=windows)
+
+
+def generate_primes(bits=1024, count=2, executor=None, searches=None, windows=4):
+    """Returns a list of count distinct random primes. With an executor,
+    searches (default: the number of cpus) searches run in parallel, each
+    checking windows sieve windows before it is resubmitted."""
+    found = []
+    if executor is None:
+        while len(found) < count:
+            prime = random_prime(bits)
+            if prime not in found:
+                found.append(prime)
+        return found
+
+    pending = set(map(lambda _: executor.submit(_prime_search, bits, windows),
+                      range(searches or os.cpu_count())))
+    while len(found) < count:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            prime = future.result()
+            if prime is not None and prime not in found:
+                found.append(prime)
+        pending |= set(map(lambda _: executor.submit(_prime_search, bits, windows), done))
+    for future in pending:
+        future.cancel()
+    return found[:count]
+
+
+class KeyPool:
+    """Pool of pre-generated RSA keypairs. A background thread keeps the
+    pool filled with up to size keypairs, generating the primes on executor
+    (if set) so that the generation does not hold the GIL."""
+
+    def __init__(self, bits=1024, size=8, executor=None):
+        self.bits = bits
+        self.executor = executor
+        self.keys = queue.Queue(maxsize=size)
+        self.hits = 0
+        self.misses = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.refill, daemon=True)
+        self.thread.start()
+
+    def refill(self):
+        """Background thread: generate keys until the pool is closed"""
+        while not self.stopped.is_set():
+            keys = RSA.new_keys(self.bits, self.executor)
+            while not self.stopped.is_set():
+                try:
+                    self.keys.put(keys, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+    def get(self):
+        """Returns a keypair from the pool, or a newly generated one
+        if the pool is empty"""
+        try:
+            keys = self.keys.get_nowait()
+            self.hits += 1
+            return keys
+        except queue.Empty:
+            self.misses += 1
+            return RSA.new_keys(self.bits, self.executor)
+
+    def stats(self):
+        """Returns the pool hit/miss metrics"""
+        return {'hits': self.hits, 'misses': self.misses, 'available': self.keys.qsize()}
+
+    def close(self):
+        """Stop the background thread"""
+        self.stopped.set()
+        self.thread.join()
+
+
+class PrivateKey(tuple):
+    """RSA private key. Behaves as the tuple (n, d), but also carries the
+    parameters used for Chinese Remainder Theorem decryption"""
+
+    def __new__(cls, n: int, d: int, p: int, q: int):
+        key = super().__new__(cls, (n, d))
+        key.p, key.q = p, q
+        key.dp, key.dq = d % (p - 1), d % (q - 1)
+        key.qinv = modular_inverse(q, p)
+        return key
+
+    def __getnewargs__(self):
+        return (self[0], self[1], self.p, self.q)
+
+
+def ordered_map(func, chunks, args=(), executor=None, window=16):
+    """Generator that yields func(chunk, *args) for every chunk, in order.
+    With an executor at most window chunks are in flight at any time, so
+    memory stays bounded for long streams of chunks"""
+    if executor is None:
+        yield from map(lambda chunk: func(chunk, *args), chunks)
+        return
+    pending = collections.deque()
+    for chunk in chunks:
+        pending.append(executor.submit(func, chunk, *args))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _encrypt_batch(blocks, key):
+    """Encrypt a list of blocks, see RSA.encrypt_blocks"""
+    n, e = key
+    return list(map(lambda t: pow(t, e, n), blocks))
+
+
+def _decrypt_batch(blocks, key):
+    """Decrypt a list of blocks, see RSA.decrypt_blocks"""
+    return list(map(lambda c: RSA.decrypt_block(c, key), blocks))
+
+
 class RSA(Cipher):
-    """RSA impl."""
+    """RSA impl.
+    The encoding and decoding methods take an optional executor (e.g. a
+    ProcessPoolExecutor), which is used to process batches of blocks in
+    parallel. The order of the blocks is preserved.
+    Keys are taken from key_pool (a KeyPool) when its number of bits match."""
+
+    def __init__(self, fast=True, key_pool=None, alphabet=PRINTABLE):
+        super().__init__(fast=fast, alphabet=alphabet)
+        self.key_pool = key_pool
+
+    def __getstate__(self):
+        # The key pool and its thread stay in this process
+        return dict(self.__dict__, key_pool=None)
 
-    def encode(self, input_str: str, key: int, bits=1024):
+    def encode(self, input_str: str, key: int, bits=1024, executor=None):
         """Encode string input_str"""
         block_size = bits//4
-        n, e = key
-        return list(
-            map(lambda t: pow(t, e, n), text_to_int_blocks(input_str, block_size))
-        )
+        return list(self.encrypt_blocks(text_to_int_blocks(input_str, block_size), key, executor))
 
-    def decode(self, blocks: list, key: str, bits=1024):
+    def decode(self, blocks: list, key: str, bits=1024, executor=None):
         """Decode """
         block_size = bits//4
-        n, d = key
-        return int_blocks_to_text(map(lambda c: pow(c, d, n), blocks), block_size)
-
-    def generate_keys(self, bits=1024):
+        return int_blocks_to_text(self.decrypt_blocks(blocks, key, executor), block_size)
+
+    def encode_batch(self, messages: list, key, bits=1024, executor=None):
+        """Encode a list of messages, the blocks of all messages are
+        encrypted together"""
+        blocks = list(map(lambda m: list(text_to_int_blocks(m, bits//4)), messages))
+        encrypted = list(self.encrypt_blocks(itertools.chain.from_iterable(blocks), key, executor))
+        return split_lengths(encrypted, map(len, blocks))
+
+    def decode_batch(self, messages: list, key, bits=1024, executor=None):
+        """Decode a list of encoded messages (lists of blocks), the blocks
+        of all messages are decrypted together"""
+        decrypted = list(self.decrypt_blocks(itertools.chain.from_iterable(messages), key, executor))
+        return list(map(lambda blocks: int_blocks_to_text(blocks, bits//4),
+                        split_lengths(decrypted, map(len, messages))))
+
+    def encode_bytes(self, data, key, executor=None):
+        """Encode bytes-like data (or a string, as utf-8) into packed blocks,
+        see bytes_to_packed_blocks. The block size is given by the key"""
+        if isinstance(data, str):
+            data = data.encode('utf_8')
+        n, _ = key
+        return list(self.encrypt_blocks(bytes_to_packed_blocks(data, packed_block_size(n)),
+                                        key, executor))
+
+    def decode_bytes(self, blocks: list, key, executor=None):
+        """Decode packed blocks from encode_bytes, returns a bytearray"""
+        return packed_blocks_to_bytes(self.decrypt_blocks(blocks, key, executor))
+
+    def decode_text(self, blocks: list, key, executor=None):
+        """Decode packed blocks from encode_bytes of a string"""
+        return self.decode_bytes(blocks, key, executor).decode('utf_8')
+
+    @staticmethod
+    def encrypt_blocks(blocks, key, executor=None, batch=16):
+        """Generator that encrypts the int blocks batch blocks at a time"""
+        return itertools.chain.from_iterable(
+            ordered_map(_encrypt_batch, chunked(blocks, batch), (key,), executor))
+
+    @staticmethod
+    def decrypt_blocks(blocks, key, executor=None, batch=16):
+        """Generator that decrypts the int blocks batch blocks at a time"""
+        return itertools.chain.from_iterable(
+            ordered_map(_decrypt_batch, chunked(blocks, batch), (key,), executor))
+
+    @staticmethod
+    def decrypt_block(block: int, key):
+        """Decrypt a single block, using the Chinese Remainder Theorem
+        when key is a PrivateKey"""
+        if not isinstance(key, PrivateKey):
+            n, d = key
+            return pow(block, d, n)
+        m1 = pow(block, key.dp, key.p)
+        m2 = pow(block, key.dq, key.q)
+        return m2 + (key.qinv * (m1 - m2) % key.p) * key.q
+
+    def encode_stream(self, source, key: int, bits=1024, executor=None):
+        """Encode source one chunk at a time, see data_chunks. Partial
+        blocks are kept until the next chunk. Yields lists of blocks"""
+        block_size = bits//4
+        buffer = b''
+        for chunk in data_chunks(source):
+            buffer += chunk
+            full = len(buffer) - len(buffer) % block_size
+            yield list(self.encrypt_blocks(bytes_to_int_blocks(buffer[:full], block_size),
+                                           key, executor))
+            buffer = buffer[full:]
+        yield list(self.encrypt_blocks(bytes_to_int_blocks(buffer, block_size), key, executor))
+
+    def decode_stream(self, source, key: str, bits=1024, batch=64, executor=None):
+        """Decode an iterable of blocks, or of lists of blocks as returned by
+        encode_stream, batch blocks at a time. Yields the decoded chunks"""
+        blocks = itertools.chain.from_iterable(
+            map(lambda x: x if isinstance(x, list) else [x], source))
+        for batch_blocks in chunked(blocks, batch):
+            yield self.decode(batch_blocks, key, bits=bits, executor=executor)
+
+    def generate_keys(self, bits=1024, executor=None):
         """Generates the keys distributed to both sender and reciever"""
-        g = primes(bits=bits)
-        p = first(g)
-        q = first(filter(lambda x: x != p, g))
+        if self.key_pool is not None and self.key_pool.bits == bits:
+            return self.key_pool.get()
+        return self.new_keys(bits, executor)
+
+    @staticmethod
+    def new_keys(bits=1024, executor=None):
+        """Generates new keys, searching for the primes on executor if set"""
+        p, q = generate_primes(bits, 2, executor)
 
         n = p * q
         oe = (p - 1) * (q - 1)
@@ -260,7 +1221,118 @@ class RSA(Cipher):
             e = randint(3, oe - 1)
             d = modular_inverse(e, oe)
 
-        return ((n, d), (n, e))  # reciever (private), sender (public)
+        return (PrivateKey(n, d, p, q), (n, e))  # reciever (private), sender (public)
+
+
+# Relative frequencies of the letters in english text
+ENGLISH_FREQUENCIES = {
+    'a': 8.17, 'b': 1.29, 'c': 2.78, 'd': 4.25, 'e': 12.70, 'f': 2.23,
+    'g': 2.02, 'h': 6.09, 'i': 6.97, 'j': 0.15, 'k': 0.77, 'l': 4.03,
+    'm': 2.41, 'n': 6.75, 'o': 7.51, 'p': 1.93, 'q': 0.10, 'r': 5.99,
+    's': 6.33, 't': 9.06, 'u': 2.76, 'v': 0.98, 'w': 2.36, 'x': 0.15,
+    'y': 1.97, 'z': 0.07,
+    ' ': 20.0, '.': 1.0, ',': 1.0, '\'': 0.2, '-': 0.2,
+}
+
+
+@lru_cache(maxsize=16)
+def reference_distribution(alphabet: str):
+    """Returns the expected distribution of the characters in alphabet in
+    english text. Capital letters are assumed to be 20 times less common
+    than lower case ones, characters not in ENGLISH_FREQUENCIES get a small
+    non-zero frequency so that they are possible but unlikely."""
+    freqs = np.array([ENGLISH_FREQUENCIES.get(c, ENGLISH_FREQUENCIES.get(c.lower(), 0) / 20)
+                      for c in alphabet]) + 0.01
+    return freqs / freqs.sum()
+
+
+def histogram(text: str, alphabet):
+    """Returns the number of occurrences of each alphabet index in text,
+    characters outside of the alphabet are handled the same way cipher_ does"""
+    alphabet = as_alphabet(alphabet)
+    indices = alphabet.indices_of(codepoints(text))
+    return np.bincount(indices[indices >= 0], minlength=len(alphabet))
+
+
+def chi_squared(cipher, counts, keys: list):
+    """Returns the chi-squared statistic of the text decoded with each key
+    against english text, given the histogram counts of the ciphertext.
+    The text is never decoded; the histogram is permuted by each key."""
+    n = len(cipher.alphabet)
+    params = np.array(list(map(cipher.decode_params, keys)), dtype=np.int64).reshape(-1, 2)
+    # decoded[k, t]: the alphabet index the ciphertext index t decodes to
+    decoded = (params[:, :1] * np.arange(n) + params[:, 1:]) % n
+    expected = max(counts.sum(), 1) * reference_distribution(cipher.alphabet.text)[decoded]
+    return ((counts - expected) ** 2 / expected).sum(axis=1)
+
+
+def rank_keys(cipher, inp: str):
+    """Returns all possible keys of cipher ranked by how likely they are
+    to be the key of the ciphertext inp, most likely first"""
+    keys = list(cipher.possible_keys())
+    scores = chi_squared(cipher, histogram(inp, cipher.alphabet), keys)
+    return [keys[i] for i in np.argsort(scores, kind='stable')]
+
+
+def column_histograms(source, alphabet, max_key_length=20):
+    """Returns a list where element L - 1 is the (L, len(alphabet)) histogram
+    of the columns of the text when it is split into columns of length L.
+    source is read one chunk at a time, see read_chunks"""
+    alphabet = as_alphabet(alphabet)
+    n = len(alphabet)
+    counts = [np.zeros(length * n, dtype=np.int64) for length in range(1, max_key_length + 1)]
+    position = 0
+    for chunk in read_chunks(source):
+        indices = alphabet.indices_of(codepoints(chunk))
+        # Characters that are not encoded still use a key position
+        positions = np.arange(position, position + len(indices))[indices >= 0]
+        position += len(indices)
+        indices = indices[indices >= 0]
+        for length, count in enumerate(counts, 1):
+            count += np.bincount(positions % length * n + indices, minlength=length * n)
+    return [count.reshape(length, n) for length, count in enumerate(counts, 1)]
+
+
+def index_of_coincidence(counts):
+    """Returns the index of coincidence of each row of the histogram counts"""
+    total = counts.sum(axis=-1)
+    return (counts * (counts - 1)).sum(axis=-1) / np.maximum(total * (total - 1), 1)
+
+
+def estimate_key_length(histograms, tolerance=0.9):
+    """Estimate the key length from the column histograms using the average
+    index of coincidence of the columns. Multiples of the key length score
+    as well as the key length itself, so the shortest length within
+    tolerance of the best one is returned."""
+    scores = list(map(lambda counts: index_of_coincidence(counts).mean(), histograms))
+    best = max(scores)
+    return first(filter(lambda length: scores[length - 1] >= tolerance * best,
+                        range(1, len(scores) + 1)))
+
+
+def kasiski_attack(cipher, source, max_key_length=20):
+    """Recover the key of an Unbreakable ciphertext without a dictionary:
+    estimate the key length from the index of coincidence, then solve each
+    column of the key as a Caesar cipher using chi_squared.
+    source is read one chunk at a time, see read_chunks"""
+    histograms = column_histograms(source, cipher.alphabet, max_key_length)
+    length = estimate_key_length(histograms)
+    if not length:
+        return None
+
+    n = len(cipher.alphabet)
+    caesar = Caesar(alphabet=cipher.alphabet)
+    keys = list(caesar.possible_keys())
+    # Decoding subtracts ord(k), so any character k with ord(k) = shift
+    # (mod len(alphabet)) works; use the first one in the alphabet
+    residues = dict(map(lambda c: (ord(c) % n, c), reversed(cipher.alphabet)))
+    shifts = map(lambda counts: keys[np.argmin(chi_squared(caesar, counts, keys))],
+                 histograms[length - 1])
+    return "".join(map(lambda shift: residues.get(shift, chr(shift)), shifts))
+
+
+# All ciphers by name
+CIPHERS = {cls.__name__: cls for cls in [Caesar, Multiplicative, Affine, Unbreakable, RSA]}
 
 
 class Person:
@@ -281,6 +1353,10 @@ class Person:
     def operate_cipher(self, inp=None):
         pass
 
+    def operate_cipher_batch(self, inputs: list):
+        """Operate the cipher on a list of inputs"""
+        return list(map(self.operate_cipher, inputs))
+
 
 class Sender(Person):
     """Sender"""
@@ -288,6 +1364,10 @@ class Sender(Person):
     def operate_cipher(self, inp=None):
         return self.cipher.encode(inp, self.key)
 
+    def operate_cipher_batch(self, inputs: list):
+        """Encode a list of messages"""
+        return self.cipher.encode_batch(inputs, self.key)
+
 
 class Reciever(Person):
     """Reciever"""
@@ -295,6 +1375,10 @@ class Reciever(Person):
     def operate_cipher(self, inp=None):
         return self.cipher.decode(inp, self.key)
 
+    def operate_cipher_batch(self, inputs: list):
+        """Decode a list of messages"""
+        return self.cipher.decode_batch(inputs, self.key)
+
 
 class Hacker(Person):
     """Hacker"""
@@ -302,20 +1386,314 @@ class Hacker(Person):
     def __init__(self, cipher):
         super().__init__(cipher=cipher)
         self.wordlist = None
+        self.model = None
+        self.prefixes = None
 
     def set_wordlist(self, wordlist):
         self.wordlist = wordlist
+        self.model = None
+        self.prefixes = None
+
+    def language_model(self):
+        """Returns the CharModel of the wordlist, built the first time"""
+        if self.model is None:
+            self.model = CharModel(self.wordlist)
+        return self.model
+
+    def word_prefixes(self):
+        """Returns the prefix lookups of the wordlist, built the first time"""
+        if self.prefixes is None:
+            self.prefixes = word_prefixes(self.wordlist)
+        return self.prefixes
+
+    def decoded(self, inp, key, chunk_size=1024):
+        """Generator that decodes inp with key one chunk of chunk_size at a
+        time, so that scoring can stop before all of it is decoded"""
+        return self.cipher.decode_stream(fixed_chunks(read_chunks(inp), chunk_size), key)
+
+    def score(self, inp, key, max_invalid=0):
+        """Score inp decoded with key as it is decoded, see lexical_score"""
+        return lexical_score(self.decoded(inp, key), self.wordlist, self.language_model(), max_invalid,
+                             prefixes=self.word_prefixes())
+
+    def rank_candidates(self, inp=None, keys=None, top=5, max_invalid=None):
+        """Rank keys (all possible keys by default) by the fraction of valid
+        words and then the n-gram likelihood of the decoded text, so that
+        near misses are found when no key gives an exact lexical match.
+        Keys with more than max_invalid invalid words are dropped early.
+        Returns: the top (key, LexicalScore) pairs, best first"""
+        keys = self.cipher.possible_keys() if keys is None else keys
+        scored = filter(lambda x: not x[1].rejected,
+                        map(lambda key: (key, self.score(inp, key, max_invalid)), keys))
+        return sorted(scored, key=lambda x: (x[1].fraction, x[1].likelihood), reverse=True)[:top]
+
+    def frequency_attack(self, inp=None, top=5):
+        """Rank all keys by frequency analysis, and return the first of the
+        top most likely keys that results in a lexical match"""
+        return first(
+            filter(lambda key: is_lexical_match(self.cipher.decode(inp, key), self.wordlist),
+                   rank_keys(self.cipher, inp)[:top])
+        )
+
+    def kasiski_attack(self, inp=None, max_key_length=20):
+        """Recover the key of an Unbreakable cipher, see kasiski_attack()"""
+        return kasiski_attack(self.cipher, inp, max_key_length=max_key_length)
+
+    def crack(self, inp=None, workers=None, chunk_size=256, prefix=32, progress=None,
+              keys=None, checkpoint=None):
+        """Same as operate_cipher, but the keys are checked in parallel by a
+        process pool, see crack()"""
+        return crack(self.cipher, inp, self.wordlist, workers=workers, chunk_size=chunk_size,
+                     prefix=prefix, progress=progress, keys=keys, checkpoint=checkpoint)
 
     def operate_cipher(self, inp=None):
         """Check all possible keys one by one and return the first key that
         results in a string only consisting of words from self.wordlist"""
         return first(
-            filter(lambda key: is_lexical_match(self.cipher.decode(inp, key), self.wordlist),
+            filter(lambda key: lexical_score(self.decoded(inp, key), self.wordlist,
+                                             prefixes=self.word_prefixes()).match,
                    self.cipher.possible_keys())
         )
 
 
-def is_lexical_match(inp: str, wordlist: set):
-    """Check if input string consists only of complete words"""
-    # NOTE: This only works on letters, not punctuation etc.
-    return all([(w in wordlist) for w in words(inp)])
+# Words are separated by whitespace, and may only start or end with
+# sentence punctuation
+TOKEN = re.compile(r'\S+')
+PUNCTUATION = '.,;:!?\'"()-'
+# Punctuation allowed around the longest word, before a token that is not
+# completed yet is given up on
+MAX_PUNCTUATION = 8
+SPACE = re.compile(r'\s')
+
+
+def tokens(text: str):
+    """Generator that yields the whitespace separated words of text"""
+    return map(lambda match: match.group(), TOKEN.finditer(text))
+
+
+def stream_tokens(stream, complete=True, wordlist=None, prefixes=None):
+    """Generator that yields the tokens (see tokens) of a stream of text
+    chunks (see read_chunks) as soon as they are completed. Tokens after the
+    last whitespace are held back until the next chunk, and the ones at the
+    end of the stream are only yielded if complete is set.
+    If prefixes (see word_prefixes) of wordlist is given, a held back token
+    that cannot become a valid token (see is_token_prefix) is yielded as
+    is, and the rest of it is skipped, so that text without whitespace is
+    rejected without holding all of it back"""
+    pending, skip = '', False
+    for chunk in read_chunks(stream):
+        text = pending + chunk
+        if skip:
+            space = SPACE.search(text)
+            if space is None:
+                continue
+            text, skip = text[space.start():], False
+        if text[-1:].isspace():
+            cut = len(text)
+        else:
+            cut = len(text) - len(text.rsplit(None, 1)[-1]) if text else 0
+        yield from tokens(text[:cut])
+        pending = text[cut:]
+        if prefixes is not None and pending and not is_token_prefix(pending, wordlist, prefixes):
+            yield pending
+            pending, skip = '', True
+    if complete:
+        yield from tokens(pending)
+
+
+def is_token_prefix(token: str, wordlist: set, prefixes):
+    """Check if the token, which is not completed yet, can become a valid
+    token (see is_valid_token): it is at most MAX_PUNCTUATION characters
+    longer than the longest word, and without its leading punctuation it
+    is a word followed by punctuation, or the prefix of a word"""
+    if len(token) > prefixes.longest + MAX_PUNCTUATION:
+        return False
+    word = token.lstrip(PUNCTUATION)
+    return word.rstrip(PUNCTUATION) in wordlist or prefixes.has_prefix(word)
+
+
+def is_valid_token(token: str, wordlist: set):
+    """Without its leading and trailing punctuation, token must be in
+    wordlist"""
+    return token.strip(PUNCTUATION) in wordlist
+
+
+class CharModel:
+    """Character n-gram model of a list of words, used to score how much a
+    text looks like the language of the words. The n-gram probabilities
+    are add-one smoothed."""
+
+    def __init__(self, words, n=2):
+        self.n = n
+        self.counts, self.contexts, chars = collections.Counter(), collections.Counter(), set()
+        for word in map(str.lower, words):
+            chars.update(word)
+            padded = ' ' * (n - 1) + word + ' '
+            grams = map(lambda i: padded[i:i + n], range(len(padded) - n + 1))
+            for gram in grams:
+                self.counts[gram] += 1
+                self.contexts[gram[:-1]] += 1
+        # The unseen characters share one extra symbol
+        self.symbols = len(chars) + 2
+
+    def log_likelihood(self, word: str):
+        """Returns the sum of the log2 probabilities of the n-grams of word,
+        and the number of n-grams"""
+        padded = ' ' * (self.n - 1) + word.lower() + ' '
+        grams = list(map(lambda i: padded[i:i + self.n], range(len(padded) - self.n + 1)))
+        return sum(map(lambda gram: math.log2((self.counts[gram] + 1)
+                                              / (self.contexts[gram[:-1]] + self.symbols)), grams)), len(grams)
+
+
+class LexicalScore(collections.namedtuple('LexicalScore', ['valid', 'words', 'likelihood', 'rejected'])):
+    """Result of lexical_score: the number of valid words, the number of
+    words scored, the average n-gram log2 likelihood of the words, and
+    whether scoring stopped early"""
+
+    @property
+    def fraction(self):
+        """Fraction of the words that are valid"""
+        return self.valid / self.words if self.words else 0.0
+
+    @property
+    def match(self):
+        """All words are valid"""
+        return not self.rejected and 0 < self.valid == self.words
+
+
+def lexical_score(stream, wordlist: set, model=None, max_invalid=0, complete=True, prefixes=None):
+    """Score a stream of decoded text chunks (see stream_tokens) one token at
+    a time. Scoring stops, and the rest of the stream is not consumed, as
+    soon as more than max_invalid words are invalid (never if max_invalid
+    is None). model is an optional CharModel for the likelihood, and
+    prefixes the optional word_prefixes of wordlist, which rejects words
+    before they are completed.
+    Returns: LexicalScore"""
+    valid = count = grams = 0
+    likelihood = 0.0
+    for token in stream_tokens(stream, complete, wordlist, prefixes):
+        count += 1
+        if is_valid_token(token, wordlist):
+            valid += 1
+        elif max_invalid is not None and count - valid > max_invalid:
+            return LexicalScore(valid, count, likelihood / max(grams, 1), True)
+        if model is not None:
+            token_likelihood, token_grams = model.log_likelihood(token.strip(PUNCTUATION))
+            likelihood += token_likelihood
+            grams += token_grams
+    return LexicalScore(valid, count, likelihood / max(grams, 1), False)
+
+
+def is_lexical_match(inp: str, wordlist: set, prefixes=None):
+    """Check if input string consists only of complete words, stops at
+    the first word that is not"""
+    return lexical_score(inp, wordlist, prefixes=prefixes).match
+
+
+def is_prefix_match(inp: str, wordlist: set, complete=False, prefixes=None):
+    """Check if all complete words in the prefix inp are in wordlist,
+    the last word is ignored unless complete is set. With prefixes (see
+    word_prefixes) the last word must be the prefix of a valid word"""
+    score = lexical_score(inp, wordlist, complete=complete, prefixes=prefixes)
+    return score.match if complete else not score.rejected
+
+
+# State of a crack() worker process, set by _crack_init
+_crack_state = {}
+
+
+def _crack_init(cipher, inp, wordlist, prefix, found, keys):
+    """Process pool initializer for crack()"""
+    _crack_state.update(cipher=cipher, inp=inp, head=inp[:prefix], wordlist=wordlist,
+                        prefixes=word_prefixes(wordlist), found=found, keys=keys)
+
+
+def _crack_chunk(positions: range):
+    """Check the keys at positions of the key space. Each key is first
+    checked against the decoded prefix of the ciphertext, including its
+    unfinished last word (see is_prefix_match), and only the survivors are
+    fully decoded.
+    Returns: (matching key or None, number of keys tried)"""
+    cipher, inp, head = _crack_state['cipher'], _crack_state['inp'], _crack_state['head']
+    wordlist, prefixes = _crack_state['wordlist'], _crack_state['prefixes']
+    found, keys = _crack_state['found'], _crack_state['keys']
+    complete = len(head) == len(inp)
+
+    for tried, key in enumerate(map(keys.key_at, positions)):
+        if found.is_set():
+            return None, tried
+        if is_prefix_match(cipher.decode(head, key), wordlist, complete, prefixes) \
+                and (complete or is_lexical_match(cipher.decode(inp, key), wordlist, prefixes)):
+            found.set()
+            return key, tried + 1
+    return None, len(positions)
+
+
+def print_progress(tried: int, elapsed: float):
+    """Progress callback for crack() which prints the number of keys/sec"""
+    print('{} keys tried in {:.2f}s ({:.0f} keys/sec)'.format(
+        tried, elapsed, tried / elapsed if elapsed else 0), file=stderr, flush=True)
+
+
+def crack(cipher, inp: str, wordlist: set, workers=None, chunk_size=256, prefix=32,
+          progress=None, keys=None, checkpoint=None):
+    """Parallel version of Hacker.operate_cipher. The keys (a KeySpace,
+    cipher.possible_keys() by default, or a shard of it) are checked in
+    chunks of chunk_size by a pool of workers processes, and the remaining
+    work is cancelled as soon as one key matches. progress(tried, elapsed)
+    is called after every chunk. If checkpoint is a path, the search is
+    resumed from it, and it is updated as chunks are completed.
+    Returns: a key that results in a lexical match or None"""
+    workers = workers or os.cpu_count()
+    keys = cipher.possible_keys() if keys is None else keys
+    found = multiprocessing.Event()
+    # Chunks complete out of order, the checkpoint is the first position
+    # that is not part of a run of completed chunks from the start
+    position = load_checkpoint(checkpoint, keys)
+    chunks, completed = keys.chunk_ranges(chunk_size, position), {}
+    start, tried, key = time.perf_counter(), 0, None
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_crack_init,
+                             initargs=(cipher, inp, wordlist, prefix, found, keys)) as executor:
+        # Only keep a few chunks per worker in flight to bound memory usage
+        pending = dict(map(lambda chunk: (executor.submit(_crack_chunk, chunk), chunk),
+                           itertools.islice(chunks, 2 * workers)))
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                chunk, (chunk_key, chunk_tried) = pending.pop(future), future.result()
+                tried += chunk_tried
+                if chunk_key is not None and key is None:
+                    key = chunk_key
+                if chunk_tried == len(chunk):
+                    completed[chunk.start] = chunk.stop
+            while position in completed:
+                position = completed.pop(position)
+            if checkpoint:
+                save_checkpoint(checkpoint, keys, position)
+            if progress:
+                progress(tried, time.perf_counter() - start)
+            if key is not None:
+                for future in pending:
+                    future.cancel()
+                break
+            pending.update(map(lambda chunk: (executor.submit(_crack_chunk, chunk), chunk),
+                               itertools.islice(chunks, len(done))))
+    return key
+
+
+# Opt-in instrumentation of the pipeline: nothing is recorded (or wrapped)
+# unless it is enabled, see crypto_stats
+PROFILER = Profiler()
+for cls in CIPHERS.values():
+    for name in ['encode', 'decode', 'encode_batch', 'decode_batch']:
+        PROFILER.register(cls, name)
+for name in ['encode_bytes', 'decode_bytes', 'decrypt_block']:
+    PROFILER.register(RSA, name)
+for name in ['operate_cipher', 'frequency_attack', 'kasiski_attack', 'rank_candidates', 'crack']:
+    PROFILER.register(Hacker, name)
+for name in ['cipher_', 'affine', 'vigenere', 'vigenere_batch', 'text_to_int_blocks', 'bytes_to_int_blocks',
+             'int_blocks_to_text', 'packed_blocks_to_bytes', 'pow', 'random_prime', 'is_lexical_match',
+             'is_prefix_match', 'lexical_score', 'rank_keys', 'histogram', 'chi_squared', 'column_histograms',
+             'kasiski_attack']:
+    PROFILER.register(sys.modules[__name__], name)
@@ -0,0 +1,363 @@
+#!/usr/bin/env python
+# File: crypto_bench.py
+# Description:
+#   Benchmarks for the ciphers in crypto.py
+"""
+Benchmarks for the performance modes of crypto.py.
+
+Usage: python crypto_bench.py unbreakable [size in MB ...]
+       python crypto_bench.py wordlist [number of words]
+       python crypto_bench.py rsa [modulus bits ...]
+       python crypto_bench.py rsa-parallel [workers ...]
+       python crypto_bench.py keys [modulus bits ...]
+       python crypto_bench.py batch [number of messages]
+       python crypto_bench.py suite [max size in MB] [threshold]
+       python crypto_bench.py baseline
+       python crypto_bench.py profile [max size in MB] [output path]
+
+The suite runs every cipher over a range of input sizes, alphabets and key
+sizes, and times the attacks of Hacker. Every run is appended to
+HISTORY, and compared to BASELINE (written by the baseline command from the
+last run in HISTORY). Cases more than THRESHOLD slower than the baseline are
+reported as regressions, and make the suite exit with status 1.
+
+The profile command runs every case of the suite once with the
+instrumentation of crypto.py enabled, prints the stages by cumulative
+time, and writes the statistics as JSON and in the pstats format.
+"""
+
+from random import choice, randint, randrange, seed
+from concurrent.futures import ProcessPoolExecutor
+from sys import argv, exit
+import datetime
+import itertools
+import json
+import os
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+from crypto import Affine, Caesar, Hacker, KeyPool, Multiplicative, RSA, Reciever, Sender, \
+    Unbreakable, Wordlist, rank_keys, Alphabet, PRINTABLE, UPPERCASE, BASE64, PROFILER
+
+HISTORY = 'bench_history.json'
+BASELINE = 'bench_baseline.json'
+THRESHOLD = 0.2
+# The per-character paths are too slow for larger inputs
+SLOW_SIZE = 1 << 20
+
+SUITE_SIZES = [1 << 10, 1 << 16, 1 << 20, 10 << 20, 100 << 20]
+RSA_SIZES = [1 << 10, 1 << 14]
+ALPHABETS = {
+    'printable': PRINTABLE,
+    'A-Z': UPPERCASE,
+    'base64': BASE64,
+    'cjk': Alphabet(map(chr, range(0x4e00, 0x4e00 + 500))),
+}
+
+
+def random_text(size: int, alphabet):
+    """Returns a random string of size characters from alphabet"""
+    chunk = "".join(choice(alphabet) for _ in range(min(size, 1 << 16)))
+    return (chunk * (size // len(chunk) + 1))[:size] if size else ""
+
+
+def timed(func, *args, **kwargs):
+    """Returns (result, seconds) of calling func"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_unbreakable(size: int, key='debug'):
+    """Compares the vectorized and the per-character Unbreakable cipher.
+    The per-character cipher only encodes the first SLOW_SIZE characters,
+    its time for larger sizes is extrapolated from that"""
+    fast, slow = Unbreakable(), Unbreakable(fast=False)
+    text = random_text(size, fast.alphabet)
+    sample = min(size, SLOW_SIZE)
+
+    enc, fast_time = timed(fast.encode, text, key)
+    slow_enc, slow_time = timed(slow.encode, text[:sample], key)
+    assert enc[:sample] == slow_enc
+    assert fast.decode(enc, key) == text
+    slow_time *= size / sample if sample else 1
+
+    mb = size / (1 << 20)
+    print('Unbreakable {:8.1f} MB: vectorized {:8.3f}s ({:8.1f} MB/s), '
+          'per-character {:8.3f}s ({:8.1f} MB/s){}'.format(
+              mb, fast_time, mb / fast_time, slow_time, mb / slow_time,
+              ' (estimated)' if sample < size else ''), flush=True)
+
+
+def traced(func, *args, **kwargs):
+    """Returns (result, seconds, peak python memory in MB) of calling func"""
+    tracemalloc.start()
+    result, seconds = timed(func, *args, **kwargs)
+    peak = tracemalloc.get_traced_memory()[1] / (1 << 20)
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def bench_wordlist(count=500000, lookups=100000):
+    """Compares cold start, memory and lookups of a set and a Wordlist"""
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    words = ["".join(choice(letters) for _ in range(randint(3, 12))) for _ in range(count)]
+    queries = words[:lookups // 2] + ["".join(choice(letters) for _ in range(8))
+                                      for _ in range(lookups // 2)]
+
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        with open(path, 'w') as f:
+            f.write('\n'.join(words))
+
+        def load_set():
+            with open(path) as f:
+                return set(map(lambda s: s.strip(), f.readlines()))
+
+        def build_index():
+            with open(path) as f:
+                Wordlist.build(f, path + '.idx')
+
+        wordset, set_time, set_mem = traced(load_set)
+        _, build_time, build_mem = traced(build_index)
+        wordlist, open_time, open_mem = traced(Wordlist, path + '.idx')
+        _, set_lookup = timed(lambda: sum(map(lambda w: w in wordset, queries)))
+        _, index_lookup = timed(lambda: sum(map(lambda w: w in wordlist, queries)))
+
+        print('Wordlist of {} words ({:.1f} MB index)'.format(
+            len(wordlist), os.path.getsize(path + '.idx') / (1 << 20)))
+        print('  set:        load {:8.3f}s {:8.1f} MB, {:10.0f} lookups/s'.format(
+            set_time, set_mem, lookups / set_lookup))
+        print('  index:     build {:8.3f}s {:8.1f} MB (once)'.format(build_time, build_mem))
+        print('  index: cold open {:8.3f}s {:8.1f} MB, {:10.0f} lookups/s'.format(
+            open_time, open_mem, lookups / index_lookup), flush=True)
+    finally:
+        os.remove(path)
+        if os.path.exists(path + '.idx'):
+            os.remove(path + '.idx')
+
+
+def bench_rsa_crt(bits: int, blocks=200):
+    """Compares plain and CRT decryption of random blocks"""
+    rsa = RSA()
+    privk, _ = rsa.generate_keys(bits=bits // 2)
+    n, _ = privk
+    cipher_blocks = [randrange(n) for _ in range(blocks)]
+
+    crt, crt_time = timed(lambda: list(map(lambda c: rsa.decrypt_block(c, privk), cipher_blocks)))
+    plain, plain_time = timed(lambda: list(map(lambda c: rsa.decrypt_block(c, tuple(privk)),
+                                               cipher_blocks)))
+    assert crt == plain
+    print('RSA {:5} bits: plain {:8.1f} blocks/s, CRT {:8.1f} blocks/s ({:.2f}x)'.format(
+        bits, blocks / plain_time, blocks / crt_time, plain_time / crt_time), flush=True)
+
+
+def bench_rsa_parallel(workers: int, bits=2048, blocks=256):
+    """Decrypts blocks with a process pool of workers processes"""
+    rsa = RSA()
+    privk, _ = rsa.generate_keys(bits=bits // 2)
+    n, _ = privk
+    cipher_blocks = [randrange(n) for _ in range(blocks)]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        _, seconds = timed(lambda: list(rsa.decrypt_blocks(cipher_blocks, privk, executor)))
+    print('RSA {} bits, {:2} workers: {:8.1f} blocks/s'.format(
+        bits, workers, blocks / seconds), flush=True)
+
+
+def bench_keys(bits: int, keys=4):
+    """Compares serial, parallel and pooled RSA key generation"""
+    rsa = RSA()
+    _, serial = timed(lambda: list(map(lambda _: rsa.generate_keys(bits // 2), range(keys))))
+    with ProcessPoolExecutor() as executor:
+        _, parallel = timed(lambda: list(map(lambda _: rsa.generate_keys(bits // 2, executor),
+                                             range(keys))))
+        pool = KeyPool(bits // 2, size=keys, executor=executor)
+        while pool.stats()['available'] < keys:
+            time.sleep(0.01)
+        _, pooled = timed(lambda: list(map(lambda _: RSA(key_pool=pool).generate_keys(bits // 2),
+                                           range(keys))))
+        pool.close()
+    print('RSA {} bits keys: serial {:.3f}s/key, parallel {:.3f}s/key, pool {:.6f}s/key {}'.format(
+        bits, serial / keys, parallel / keys, pooled / keys, pool.stats()), flush=True)
+
+
+def bench_batch(count=100000, length=32):
+    """Compares messages/sec of one-by-one and batch encoding/decoding"""
+    for cipher, key in [(Caesar(), 3), (Multiplicative(), 11), (Affine(), (3, 4)),
+                        (Unbreakable(), 'debug')]:
+        messages = [random_text(length, cipher.alphabet) for _ in range(count)]
+        sender, reciever = Sender(key, cipher), Reciever(key, cipher)
+        encoded, batch_enc = timed(sender.operate_cipher_batch, messages)
+        _, batch_dec = timed(reciever.operate_cipher_batch, encoded)
+        _, single_enc = timed(lambda: list(map(sender.operate_cipher, messages)))
+        _, single_dec = timed(lambda: list(map(reciever.operate_cipher, encoded)))
+        print('{:14} {} x {} chars: one-by-one {:9.0f}/{:9.0f} msg/s, '
+              'batch {:9.0f}/{:9.0f} msg/s (encode/decode)'.format(
+                  type(cipher).__name__, count, length, count / single_enc, count / single_dec,
+                  count / batch_enc, count / batch_dec), flush=True)
+
+
+def best_of(func, repeats: int):
+    """Returns the fastest of repeats timings of func in seconds per call.
+    Fast functions are called in loops of at least 0.2s to reduce noise"""
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeats, number)) / number
+
+
+def cipher_cases(max_size: int):
+    """Generator that yields (name, bytes, func) for the cipher cases"""
+    ciphers = [(Caesar, 3), (Multiplicative, 11), (Affine, (3, 4)), (Unbreakable, 'debug')]
+    for (cls, key), (alphabet_name, alphabet), fast in itertools.product(
+            ciphers, ALPHABETS.items(), [True, False]):
+        cipher = cls(fast=fast, alphabet=alphabet)
+        for size in filter(lambda size: size <= (max_size if fast else min(max_size, SLOW_SIZE)), SUITE_SIZES):
+            text = random_text(size, alphabet)
+            encoded = cipher.encode(text, key)
+            name = '{}/{}/{}/{}'.format(cls.__name__, alphabet_name, 'fast' if fast else 'slow', size)
+            yield name + '/encode', size, lambda c=cipher, t=text, k=key: c.encode(t, k)
+            yield name + '/decode', size, lambda c=cipher, t=encoded, k=key: c.decode(t, k)
+
+
+def rsa_cases(max_size: int, bits=(512, 1024, 2048)):
+    """Generator that yields (name, bytes, func) for the RSA cases"""
+    rsa = RSA()
+    for modulus in bits:
+        privk, pubk = rsa.generate_keys(bits=modulus // 2)
+        for size in filter(lambda size: size <= max_size, RSA_SIZES):
+            text = random_text(size, rsa.alphabet)
+            blocks = rsa.encode_bytes(text, pubk)
+            name = 'RSA/{}/{}'.format(modulus, size)
+            yield name + '/encode', size, lambda t=text, k=pubk: rsa.encode_bytes(t, k)
+            yield name + '/decode', size, lambda b=blocks, k=privk: rsa.decode_bytes(b, k)
+            yield name + '/decode-plain', size, lambda b=blocks, k=tuple(privk): rsa.decode_bytes(b, k)
+
+
+def hacker_cases():
+    """Generator that yields (name, bytes, func) for the Hacker attacks"""
+    text = ('it was the best of times it was the worst of times it was the age of '
+            'wisdom it was the age of foolishness it was the epoch of belief ') * 4
+    wordlist = set(text.split())
+    for cls, key in [(Caesar, 24), (Multiplicative, 11), (Affine, (7, 11))]:
+        cipher = cls()
+        hacker = Hacker(cipher)
+        hacker.set_wordlist(wordlist)
+        encoded = cipher.encode(text, key)
+        name = 'Hacker/{}'.format(cls.__name__)
+        yield name + '/brute-force', len(text), lambda h=hacker, e=encoded: h.operate_cipher(e)
+        yield name + '/frequency', len(text), lambda h=hacker, e=encoded: h.frequency_attack(e)
+        yield name + '/rank', len(text), lambda c=cipher, e=encoded: rank_keys(c, e)
+    hacker = Hacker(Unbreakable())
+    encoded = hacker.cipher.encode(text, 'debug')
+    yield 'Hacker/Unbreakable/kasiski', len(text), lambda: hacker.kasiski_attack(encoded)
+
+
+def run_suite(max_size=100 << 20):
+    """Run every case, returns {name: {'seconds': .., 'mb_per_s': ..}}"""
+    # The same inputs and RSA keys in every run
+    seed(0)
+    results = {}
+    cases = itertools.chain(cipher_cases(max_size), rsa_cases(max_size), hacker_cases())
+    for name, size, func in cases:
+        seconds = best_of(func, 3)
+        results[name] = {'seconds': seconds, 'mb_per_s': size / (1 << 20) / seconds}
+        print('{:50} {:10.6f}s {:10.2f} MB/s'.format(name, seconds, results[name]['mb_per_s']),
+              flush=True)
+    return results
+
+
+def regressions(results: dict, baseline: dict, threshold=THRESHOLD):
+    """Returns [(name, seconds, baseline seconds)] of the cases that are
+    more than threshold slower than in baseline"""
+    return [(name, result['seconds'], baseline[name]['seconds'])
+            for name, result in sorted(results.items())
+            if name in baseline and result['seconds'] > baseline[name]['seconds'] * (1 + threshold)]
+
+
+def load_json(path: str, default):
+    """Returns the contents of the JSON file path, or default"""
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_json(path: str, data):
+    """Write data to the JSON file path"""
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+
+
+def suite(max_size=100 << 20, threshold=THRESHOLD):
+    """Run the suite, record it in HISTORY and compare it to BASELINE.
+    Returns the number of regressions"""
+    results = run_suite(max_size)
+    history = load_json(HISTORY, [])
+    history.append({'time': datetime.datetime.now().isoformat(), 'results': results})
+    save_json(HISTORY, history)
+
+    baseline = load_json(BASELINE, None)
+    if baseline is None:
+        print('No baseline, run "python crypto_bench.py baseline" to store this run')
+        return 0
+    slower = regressions(results, baseline, threshold)
+    for name, seconds, base in slower:
+        print('REGRESSION {:50} {:10.6f}s, baseline {:10.6f}s ({:+.0f}%)'.format(
+            name, seconds, base, (seconds / base - 1) * 100))
+    print('{} regressions (threshold {:.0f}%)'.format(len(slower), threshold * 100), flush=True)
+    return len(slower)
+
+
+def store_baseline():
+    """Store the last run in HISTORY as BASELINE"""
+    history = load_json(HISTORY, [])
+    if not history:
+        print('No runs in {}'.format(HISTORY))
+        return 1
+    save_json(BASELINE, history[-1]['results'])
+    print('Stored the run of {} as the baseline'.format(history[-1]['time']))
+    return 0
+
+
+def profile(max_size=1 << 20, path='bench_profile'):
+    """Run every case once with PROFILER enabled, print the stages and
+    write path + '.json' and path + '.prof' (see pstats)"""
+    seed(0)
+    cases = itertools.chain(cipher_cases(max_size), rsa_cases(max_size), hacker_cases())
+    PROFILER.reset()
+    with PROFILER:
+        for _, _, func in cases:
+            func()
+    print('{:30} {:>10} {:>12} {:>10} {:>10}'.format('stage', 'calls', 'bytes', 'time', 'own time'))
+    for name, stage in PROFILER.stats().items():
+        print('{:30} {:10} {:12} {:10.4f} {:10.4f}'.format(
+            name, stage['calls'], stage['bytes'], stage['time'], stage['own_time']))
+    PROFILER.dump_json(path + '.json')
+    PROFILER.dump_stats(path + '.prof')
+
+
+if __name__ == '__main__':
+    if argv[1:2] == ['suite']:
+        max_size = int(float(argv[2]) * (1 << 20)) if len(argv) > 2 else 100 << 20
+        exit(1 if suite(max_size, *map(float, argv[3:4])) else 0)
+    elif argv[1:2] == ['baseline']:
+        exit(store_baseline())
+    elif argv[1:2] == ['profile']:
+        profile(int(float(argv[2]) * (1 << 20)) if len(argv) > 2 else 1 << 20, *argv[3:4])
+    elif argv[1:2] == ['wordlist']:
+        bench_wordlist(*map(int, argv[2:3]))
+    elif argv[1:2] == ['rsa-parallel']:
+        list(map(bench_rsa_parallel, list(map(int, argv[2:])) or [1, 2, 4, 8, 16, 32]))
+    elif argv[1:2] == ['batch']:
+        bench_batch(*map(int, argv[2:3]))
+    elif argv[1:2] == ['keys']:
+        list(map(bench_keys, list(map(int, argv[2:])) or [1024, 2048]))
+    elif argv[1:2] == ['rsa']:
+        list(map(bench_rsa_crt, list(map(int, argv[2:])) or [1024, 2048, 4096]))
+    else:
+        sizes = list(map(float, argv[2:])) or [1, 10, 100, 1024]
+        list(map(lambda mb: bench_unbreakable(int(mb * (1 << 20))), sizes))
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+# File: crypto_container.py
+# Description:
+#   Binary container format for ciphertexts from crypto.py
+"""
+Binary container format for ciphertexts.
+
+Layout (little endian):
+    header: MAGIC, version (u16), cipher name and alphabet (u32 length +
+            utf-8 each), salt (16 bytes), key fingerprint (16 bytes),
+            block size (u32)
+    blocks: u32 length + payload, for every block
+    index:  u64 offset of every block
+    footer: u64 number of blocks, u64 offset of the index, INDEX_MAGIC
+
+RSA blocks are packed blocks (see bytes_to_packed_blocks) of block size
+bytes, other ciphers store utf-8 encoded blocks of block size characters.
+Every block can be decoded on its own, so a range of blocks can be read
+from a large container without decoding the rest of it.
+"""
+
+from array import array
+import hashlib
+import hmac
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from crypto import CIPHERS, RSA, text_chunks, data_chunks, fixed_chunks, \
+    bytes_to_packed_blocks, packed_block_size, packed_blocks_to_bytes
+
+MAGIC = b'CRYPTBOX'
+INDEX_MAGIC = b'CRYPTIDX'
+VERSION = 2
+SALT_SIZE = 16
+FOOTER = struct.Struct('<QQ8s')
+LENGTH = struct.Struct('<I')
+
+
+def key_fingerprint(cipher, key, salt: bytes):
+    """Returns a 16 byte fingerprint of key, the HMAC of key keyed by the
+    random salt of the container, so that it cannot be checked against
+    precomputed fingerprints of keys. For RSA only the (public) modulus is
+    used, so that the public and private key have the same fingerprint"""
+    if isinstance(cipher, RSA):
+        return hashlib.sha256(repr(key[0]).encode('utf_8')).digest()[:16]
+    return hmac.new(salt, repr(key).encode('utf_8'), hashlib.sha256).digest()[:16]
+
+
+def write_string(file, str_: str):
+    """Write a length-prefixed utf-8 string"""
+    data = str_.encode('utf_8')
+    file.write(LENGTH.pack(len(data)))
+    file.write(data)
+
+
+def encoded_blocks(cipher, key, source, block_size: int, executor=None):
+    """Generator that yields the encoded payload of every block"""
+    if isinstance(cipher, RSA):
+        n, _ = key
+        length = (n.bit_length() + 7) // 8
+        blocks = map(lambda data: next(bytes_to_packed_blocks(data, block_size)),
+                     fixed_chunks(data_chunks(source), block_size))
+        return map(lambda block: block.to_bytes(length, 'big'),
+                   cipher.encrypt_blocks(blocks, key, executor))
+    return map(lambda enc: enc.encode('utf_8'),
+               cipher.encode_stream(fixed_chunks(text_chunks(source), block_size), key))
+
+
+def write_container(file, cipher, key, source, block_size=None, executor=None):
+    """Encode source (see read_chunks) with cipher and key, and write the
+    container to the binary file object file. For RSA key is the public
+    key. Returns the number of blocks written"""
+    if block_size is None:
+        block_size = packed_block_size(key[0]) if isinstance(cipher, RSA) else 4096
+
+    file.write(MAGIC)
+    file.write(struct.pack('<H', VERSION))
+    write_string(file, type(cipher).__name__)
+    write_string(file, "".join(cipher.alphabet))
+    salt = os.urandom(SALT_SIZE)
+    file.write(salt)
+    file.write(key_fingerprint(cipher, key, salt))
+    file.write(LENGTH.pack(block_size))
+
+    offsets = array('Q')
+    position = file.tell()
+    for payload in encoded_blocks(cipher, key, source, block_size, executor):
+        offsets.append(position)
+        file.write(LENGTH.pack(len(payload)))
+        file.write(payload)
+        position += LENGTH.size + len(payload)
+
+    file.write(np.asarray(offsets, dtype='<u8').tobytes())
+    file.write(FOOTER.pack(len(offsets), position, INDEX_MAGIC))
+    return len(offsets)
+
+
+class Container:
+    """Memory-mapped reader of a container written by write_container"""
+
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:len(MAGIC)] != MAGIC:
+            raise ValueError('{} is not a cipher container'.format(path))
+        self.count, index_offset, index_magic = FOOTER.unpack_from(self.mm, len(self.mm) - FOOTER.size)
+        if index_magic != INDEX_MAGIC:
+            raise ValueError('{} has no block index'.format(path))
+        self.offsets = np.frombuffer(self.mm, dtype='<u8', count=self.count, offset=index_offset)
+
+        position = len(MAGIC)
+        self.version, = struct.unpack_from('<H', self.mm, position)
+        if self.version != VERSION:
+            raise ValueError('{} has unsupported version {}'.format(path, self.version))
+        position += 2
+        self.cipher_name, position = self.read_string(position)
+        alphabet, position = self.read_string(position)
+        self.alphabet = list(alphabet)
+        self.salt = self.mm[position:position + SALT_SIZE]
+        position += SALT_SIZE
+        self.fingerprint = self.mm[position:position + 16]
+        self.block_size, = LENGTH.unpack_from(self.mm, position + 16)
+
+    def read_string(self, position: int):
+        """Returns a length-prefixed string and the position after it"""
+        length, = LENGTH.unpack_from(self.mm, position)
+        start = position + LENGTH.size
+        return self.mm[start:start + length].decode('utf_8'), start + length
+
+    def __len__(self):
+        return self.count
+
+    def block(self, i: int):
+        """Returns the payload of block i, without copying it"""
+        offset = int(self.offsets[i])
+        length, = LENGTH.unpack_from(self.mm, offset)
+        return memoryview(self.mm)[offset + LENGTH.size:offset + LENGTH.size + length]
+
+    def cipher(self):
+        """Returns an instance of the cipher used to write the container"""
+        cipher = CIPHERS[self.cipher_name]()
+        cipher.alphabet = self.alphabet
+        return cipher
+
+    def read(self, key, start=0, stop=None, executor=None):
+        """Decode the blocks in range(start, stop). Returns a bytearray for
+        RSA containers and a string for the other ciphers"""
+        cipher = self.cipher()
+        if not hmac.compare_digest(key_fingerprint(cipher, key, self.salt), self.fingerprint):
+            raise ValueError('Wrong key for this container')
+        indices = range(*slice(start, stop).indices(self.count))
+
+        if isinstance(cipher, RSA):
+            blocks = map(lambda i: int.from_bytes(self.block(i), 'big'), indices)
+            return packed_blocks_to_bytes(cipher.decrypt_blocks(blocks, key, executor))
+        return "".join(map(lambda i: cipher.decode_at(str(self.block(i), 'utf_8'), key,
+                                                      i * self.block_size), indices))
+
+    def close(self):
+        """Unmap the file"""
+        self.offsets = None
+        self.mm.close()
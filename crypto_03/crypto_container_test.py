@@ -0,0 +1,92 @@
+import hashlib
+import os
+import tempfile
+import unittest
+
+from crypto import *
+from crypto_container import *
+
+
+class TestContainer(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.inp = 'THIS IS A TEST with ~ lower case. ' * 40
+
+
+    def tearDown(self):
+        os.remove(self.path)
+
+
+    def write(self, cipher, key, block_size=None):
+        with open(self.path, 'wb') as f:
+            return write_container(f, cipher, key, iter([self.inp[:100], self.inp[100:]]),
+                                   block_size=block_size)
+
+
+    def check_text_cipher(self, cipher, key):
+        count = self.write(cipher, key, block_size=64)
+        container = Container(self.path)
+        self.assertEqual(len(container), count)
+        self.assertEqual(container.cipher_name, type(cipher).__name__)
+        self.assertEqual(container.read(key), self.inp)
+        self.assertEqual(container.read(key, 3, 5), self.inp[3 * 64:5 * 64])
+        self.assertEqual(container.read(key, count - 1), self.inp[(count - 1) * 64:])
+        container.close()
+
+
+    def test_caesar(self):
+        self.check_text_cipher(Caesar(), 3)
+
+
+    def test_affine(self):
+        self.check_text_cipher(Affine(), (3, 4))
+
+
+    def test_unbreakable(self):
+        self.check_text_cipher(Unbreakable(), 'debug')
+
+
+    def test_rsa(self):
+        p, q, e = 2**61 - 1, 2**89 - 1, 65537
+        n, d = p * q, modular_inverse(e, (p - 1) * (q - 1))
+        privk, pubk = PrivateKey(n, d, p, q), (n, e)
+        self.inp = 'THIS IS A TEST æøå with ~ lower case\n' * 40
+        self.write(RSA(), pubk)
+
+        container = Container(self.path)
+        data = self.inp.encode('utf_8')
+        size = container.block_size
+        self.assertEqual(container.read(privk).decode('utf_8'), self.inp)
+        self.assertEqual(container.read(privk, 2, 7), data[2 * size:7 * size])
+
+
+    def test_wrong_key(self):
+        self.write(Caesar(), 3)
+        with self.assertRaises(ValueError):
+            Container(self.path).read(4)
+
+
+    def test_salted_fingerprint(self):
+        self.write(Caesar(), 3)
+        container = Container(self.path)
+        salt, fingerprint = container.salt, container.fingerprint
+        container.close()
+        self.write(Caesar(), 3)
+        container = Container(self.path)
+        self.assertNotEqual(container.salt, salt)
+        self.assertNotEqual(container.fingerprint, fingerprint)
+        self.assertNotEqual(container.fingerprint, hashlib.sha256(b'3').digest()[:16])
+        self.assertEqual(container.read(3), self.inp)
+        container.close()
+
+
+    def test_not_a_container(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a container at all')
+        with self.assertRaises(ValueError):
+            Container(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
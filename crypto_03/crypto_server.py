@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# File: crypto_server.py
+# Description:
+#   Asyncio service for the ciphers in crypto.py
+"""
+Asyncio service exposing encode, decode and crack for every cipher.
+
+Protocol: newline delimited JSON over a TCP or Unix socket. A request is
+    {"id": id, "op": "encode" | "decode" | "crack", "cipher": name,
+     "key": key, "data": data}
+and is answered by {"id": id, "result": result} or {"id": id, "error": message}.
+Keys are given as JSON lists where the ciphers use tuples. RSA private keys
+may be given as [n, d, p, q] to use CRT decryption. Requests on a connection
+are pipelined: they are handled concurrently, and the responses can arrive
+in any order. RSA and crack requests run on a process pool.
+
+Usage: python crypto_server.py serve [port | unix socket path] [wordlist]
+       python crypto_server.py load [port | unix socket path] [requests] [concurrency]
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from sys import argv
+import asyncio
+import itertools
+import json
+import time
+
+import numpy as np
+
+from crypto import CIPHERS, RSA, Unbreakable, Hacker, PrivateKey, first, rank_keys, load_wordlist
+
+# Maximum length of a request line
+LIMIT = 1 << 26
+
+
+@lru_cache(maxsize=None)
+def cipher_instance(name: str):
+    """Returns the (shared) instance of the cipher name"""
+    if name not in CIPHERS:
+        raise ValueError('Unknown cipher {}'.format(name))
+    return CIPHERS[name]()
+
+
+def from_json_key(key):
+    """Convert a key from its JSON representation"""
+    if isinstance(key, list) and len(key) == 4:
+        return PrivateKey(*key)
+    if isinstance(key, list):
+        return tuple(key)
+    return key
+
+
+def crack_key(cipher, data, wordlist=None):
+    """Returns the most likely key of the ciphertext data"""
+    if isinstance(cipher, Unbreakable):
+        return Hacker(cipher).kasiski_attack(data)
+    if cipher.translatable and wordlist is None:
+        return first(rank_keys(cipher, data))
+    hacker = Hacker(cipher)
+    hacker.set_wordlist(wordlist)
+    if cipher.translatable:
+        return hacker.frequency_attack(data)
+    return hacker.operate_cipher(data)
+
+
+def operate(op: str, name: str, key, data, wordlist=None):
+    """Handle one request, in this process or on a pool worker"""
+    cipher = cipher_instance(name)
+    if op == 'encode':
+        return cipher.encode(data, from_json_key(key))
+    if op == 'decode':
+        return cipher.decode(data, from_json_key(key))
+    if op == 'crack':
+        return crack_key(cipher, data, wordlist)
+    raise ValueError('Unknown operation {}'.format(op))
+
+
+class CipherServer:
+    """Serves requests, see the module documentation"""
+
+    def __init__(self, executor=None, wordlist=None, max_in_flight=256):
+        self.executor = executor or ProcessPoolExecutor()
+        self.wordlist = wordlist
+        self.max_in_flight = max_in_flight
+
+    def is_cpu_heavy(self, request):
+        """RSA and crack requests are run on the process pool"""
+        return request.get('op') == 'crack' or request.get('cipher') == RSA.__name__
+
+    async def run(self, request):
+        """Returns the result of a request"""
+        args = (request.get('op'), request.get('cipher'), request.get('key'),
+                request.get('data'), self.wordlist)
+        if self.is_cpu_heavy(request):
+            return await asyncio.get_event_loop().run_in_executor(self.executor, operate, *args)
+        return operate(*args)
+
+    async def respond(self, line, writer, lock, in_flight):
+        """Handle one request line and write the response"""
+        request = {}
+        try:
+            try:
+                parsed = json.loads(line)
+                if not isinstance(parsed, dict):
+                    raise ValueError('A request must be a JSON object')
+                request = parsed
+                response = {'id': request.get('id'), 'result': await self.run(request)}
+            except Exception as e:  # Errors are reported to the client
+                response = {'id': request.get('id'), 'error': '{}: {}'.format(type(e).__name__, e)}
+            writer.write((json.dumps(response) + '\n').encode('utf_8'))
+            async with lock:
+                await writer.drain()
+        finally:
+            in_flight.release()
+
+    async def handle(self, reader, writer):
+        """Handle a connection until the client closes it"""
+        lock, in_flight, tasks = asyncio.Lock(), asyncio.Semaphore(self.max_in_flight), set()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            await in_flight.acquire()
+            task = asyncio.ensure_future(self.respond(line, writer, lock, in_flight))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+        writer.close()
+
+    async def start(self, address):
+        """Start serving on a TCP port (int) or a Unix socket path (str)"""
+        if isinstance(address, int):
+            return await asyncio.start_server(self.handle, '127.0.0.1', address, limit=LIMIT)
+        return await asyncio.start_unix_server(self.handle, address, limit=LIMIT)
+
+
+class Client:
+    """Pipelining client, many requests can be in flight on one connection"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.ids = itertools.count()
+        self.pending = {}
+        self.receiver = asyncio.ensure_future(self.receive())
+
+    @classmethod
+    async def connect(cls, address):
+        """Connect to a TCP port (int) or a Unix socket path (str)"""
+        if isinstance(address, int):
+            return cls(*await asyncio.open_connection('127.0.0.1', address, limit=LIMIT))
+        return cls(*await asyncio.open_unix_connection(address, limit=LIMIT))
+
+    async def receive(self):
+        """Dispatch the responses to the waiting requests"""
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            response = json.loads(line)
+            future = self.pending.pop(response['id'])
+            if 'error' in response:
+                future.set_exception(RuntimeError(response['error']))
+            else:
+                future.set_result(response['result'])
+        for future in self.pending.values():
+            future.set_exception(ConnectionError('Connection closed'))
+
+    async def request(self, op: str, cipher: str, key, data):
+        """Send a request and wait for its result"""
+        request_id = next(self.ids)
+        future = asyncio.get_event_loop().create_future()
+        self.pending[request_id] = future
+        request = {'id': request_id, 'op': op, 'cipher': cipher, 'key': key, 'data': data}
+        self.writer.write((json.dumps(request) + '\n').encode('utf_8'))
+        await self.writer.drain()
+        return await future
+
+    async def close(self):
+        """Close the connection"""
+        self.writer.close()
+        await self.receiver
+
+
+async def load(address, requests=10000, concurrency=64, cipher='Caesar', key=3, size=64):
+    """Load generator: send a number of encode requests over one connection
+    with at most concurrency in flight, and report the latencies"""
+    client = await Client.connect(address)
+    data = 'THIS IS A TEST ' * (size // 15 + 1)
+    latencies, slots = [], asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with slots:
+            start = time.perf_counter()
+            await client.request('encode', cipher, key, data[:size])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*map(lambda _: one(), range(requests)))
+    elapsed = time.perf_counter() - start
+    await client.close()
+
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    print('{} requests in {:.2f}s ({:.0f} req/s), p50 {:.3f}ms, p99 {:.3f}ms'.format(
+        requests, elapsed, requests / elapsed, p50, p99), flush=True)
+    return p50, p99
+
+
+def parse_address(address: str):
+    """Port number or Unix socket path"""
+    return int(address) if address.isdigit() else address
+
+
+async def serve(address, wordlist=None):
+    """Serve forever"""
+    server = await CipherServer(wordlist=wordlist).start(address)
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    address = parse_address(argv[2] if len(argv) > 2 else '8765')
+    if argv[1:2] == ['load']:
+        asyncio.run(load(address, *map(int, argv[3:5])))
+    else:
+        asyncio.run(serve(address, load_wordlist(argv[3]) if len(argv) > 3 else None))
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+from crypto import *
+from crypto_server import *
+
+
+class TestCipherServer(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.address = os.path.join(self.dir.name, 'crypto.sock')
+        self.executor = ProcessPoolExecutor(max_workers=2)
+
+
+    def tearDown(self):
+        self.executor.shutdown()
+        self.dir.cleanup()
+
+
+    def run_client(self, func):
+        async def run():
+            server = await CipherServer(executor=self.executor).start(self.address)
+            client = await Client.connect(self.address)
+            try:
+                return await func(client)
+            finally:
+                await client.close()
+                server.close()
+                await server.wait_closed()
+        return asyncio.run(run())
+
+
+    def test_encode_decode(self):
+        async def func(client):
+            e = await client.request('encode', 'Affine', [3, 4], 'THIS IS A TEST')
+            self.assertEqual(e, Affine().encode('THIS IS A TEST', (3, 4)))
+            return await client.request('decode', 'Affine', [3, 4], e)
+        self.assertEqual(self.run_client(func), 'THIS IS A TEST')
+
+
+    def test_rsa(self):
+        p, q, e = 2**61 - 1, 2**89 - 1, 65537
+        n, d = p * q, modular_inverse(e, (p - 1) * (q - 1))
+        inp = 'THIALSDLJ lkjasdf poUIASD 123 |09802 39812'
+
+        async def func(client):
+            blocks = await client.request('encode', 'RSA', [n, e], inp)
+            return await client.request('decode', 'RSA', [n, d, p, q], blocks)
+        self.assertEqual(self.run_client(func), RSA().decode(RSA().encode(inp, (n, e)), (n, d)))
+
+
+    def test_pipelined(self):
+        messages = list(map(lambda i: 'message number {}'.format(i), range(100)))
+
+        async def func(client):
+            return await asyncio.gather(*map(lambda m: client.request('encode', 'Caesar', 3, m),
+                                             messages))
+        self.assertEqual(self.run_client(func), Caesar().encode_batch(messages, 3))
+
+
+    def test_crack(self):
+        inp = 'the quick brown fox jumps over the lazy dog and the end'
+
+        async def func(client):
+            return await client.request('crack', 'Multiplicative', None,
+                                        Multiplicative().encode(inp, 11))
+        self.assertEqual(self.run_client(func), 11)
+
+
+    def test_error(self):
+        async def func(client):
+            with self.assertRaises(RuntimeError):
+                await client.request('encode', 'Nope', 3, 'abc')
+            with self.assertRaises(RuntimeError):
+                await client.request('frobnicate', 'Caesar', 3, 'abc')
+            return await client.request('encode', 'Caesar', 1, 'abc')
+        self.assertEqual(self.run_client(func), 'bcd')
+
+
+    def test_not_an_object(self):
+        async def run():
+            server = await CipherServer(executor=self.executor, max_in_flight=2).start(self.address)
+            reader, writer = await asyncio.open_unix_connection(self.address)
+            writer.write(b'[1]\n"abc"\n{"id": 7, "op": "encode", "cipher": "Caesar", "key": 1, "data": "abc"}\n')
+            responses = [json.loads(await asyncio.wait_for(reader.readline(), 5)) for _ in range(3)]
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return responses
+        responses = asyncio.run(run())
+        self.assertEqual([response['id'] for response in responses], [None, None, 7])
+        self.assertIn('error', responses[0])
+        self.assertEqual(responses[2]['result'], 'bcd')
+
+
+    def test_load(self):
+        async def run():
+            server = await CipherServer(executor=self.executor).start(self.address)
+            p50, p99 = await load(self.address, requests=200, concurrency=16)
+            server.close()
+            await server.wait_closed()
+            return p50, p99
+        p50, p99 = asyncio.run(run())
+        self.assertLessEqual(p50, p99)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# File: crypto_stats.py
+# Description:
+#   Opt-in instrumentation of the cipher pipeline
+"""
+Opt-in instrumentation of the functions and methods of a module.
+
+Stages (functions, methods or builtins like pow) are registered with a
+Profiler, but they are only wrapped while it is enabled, so there is no
+cost at all when it is disabled. An enabled profiler records the number
+of calls, the size of the input (len of strings and bytes, the byte
+length of ints) and the cumulative and own time of every stage.
+
+Only calls in this process are recorded, work done by the workers of a
+process pool is not.
+
+Usage:
+    with PROFILER:
+        ...
+    PROFILER.stats()            # {stage: {'calls': .., 'bytes': .., ...}}
+    PROFILER.dump_json(path)
+    PROFILER.dump_stats(path)   # pstats.Stats(path), snakeviz etc.
+"""
+
+from functools import wraps
+import builtins
+import inspect
+import json
+import marshal
+import threading
+import time
+
+
+def size_of(value):
+    """Returns the size of value in bytes (characters for strings)"""
+    if isinstance(value, (str, bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, int) and not isinstance(value, bool):
+        return (value.bit_length() + 7) // 8
+    if isinstance(value, list):
+        return sum(map(size_of, value))
+    return 0
+
+
+class Stage:
+    """Statistics of one stage"""
+
+    def __init__(self, name: str, code):
+        self.name = name
+        # (file name, line number, function name) as used by pstats
+        self.code = code
+        self.calls = 0
+        self.bytes = 0
+        self.time = 0.0
+        self.own_time = 0.0
+        # Caller stage name -> [calls, own time, time]
+        self.callers = {}
+
+    def as_dict(self):
+        return {'calls': self.calls, 'bytes': self.bytes, 'time': self.time, 'own_time': self.own_time,
+                'callers': {name: dict(zip(['calls', 'own_time', 'time'], caller))
+                            for name, caller in self.callers.items()}}
+
+
+class Profiler:
+    """Records the stages registered with register while it is enabled,
+    see the module documentation"""
+
+    def __init__(self):
+        self.registered = []
+        self.installed = []
+        self.stages = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def register(self, owner, name: str, stage=None):
+        """Register the attribute name of owner (a module or a class) as
+        the stage stage (default: Class.name or name). Builtins can be
+        registered on a module that uses them"""
+        if stage is None:
+            stage = '{}.{}'.format(owner.__name__, name) if inspect.isclass(owner) else name
+        self.registered.append((owner, name, stage))
+
+    @property
+    def enabled(self):
+        return bool(self.installed)
+
+    def enable(self):
+        """Install the wrappers of all registered stages"""
+        if self.enabled:
+            return
+        for owner, name, stage in self.registered:
+            own = name in vars(owner)
+            original = vars(owner)[name] if own else inspect.getattr_static(owner, name, None)
+            if original is None:
+                original = getattr(builtins, name)
+            setattr(owner, name, self.wrap(original, stage, skip_self=inspect.isclass(owner)))
+            self.installed.append((owner, name, original if own else None))
+
+    def disable(self):
+        """Restore the original stages"""
+        for owner, name, original in reversed(self.installed):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self.installed = []
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc):
+        self.disable()
+
+    def reset(self):
+        """Forget all recorded statistics"""
+        with self.lock:
+            self.stages = {}
+
+    def wrap(self, original, stage: str, skip_self=True):
+        """Returns the recording wrapper of original"""
+        static = isinstance(original, staticmethod)
+        func = original.__func__ if static else original
+        code = getattr(func, '__code__', None)
+        code = (code.co_filename, code.co_firstlineno, stage) if code else ('~', 0, '<built-in {}>'.format(stage))
+        skip = 1 if skip_self and not static else 0
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            # The stack holds [stage, time spent in recorded callees]
+            stack = self.local.__dict__.setdefault('stack', [])
+            stack.append([stage, 0.0])
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                _, children = stack.pop()
+                caller = None
+                if stack:
+                    stack[-1][1] += elapsed
+                    caller = stack[-1][0]
+                self.record(stage, code, caller, args[skip] if len(args) > skip else None,
+                            elapsed, elapsed - children)
+
+        return staticmethod(wrapper) if static else wrapper
+
+    def record(self, name, code, caller, arg, elapsed, own):
+        """Add one call of the stage name"""
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = Stage(name, code)
+            stage.calls += 1
+            stage.bytes += size_of(arg)
+            stage.time += elapsed
+            stage.own_time += own
+            if caller is not None:
+                edge = stage.callers.setdefault(caller, [0, 0.0, 0.0])
+                edge[0] += 1
+                edge[1] += own
+                edge[2] += elapsed
+
+    def stats(self):
+        """Returns {stage: {'calls', 'bytes', 'time', 'own_time', 'callers'}},
+        sorted by cumulative time"""
+        with self.lock:
+            stages = sorted(self.stages.values(), key=lambda stage: stage.time, reverse=True)
+            return {stage.name: stage.as_dict() for stage in stages}
+
+    def to_json(self):
+        return json.dumps(self.stats(), indent=2)
+
+    def dump_json(self, path: str):
+        with open(path, 'w') as f:
+            f.write(self.to_json())
+
+    def pstats(self):
+        """Returns the statistics in the format of pstats (and cProfile):
+        {(file, line, function): (primitive calls, calls, own time, time, callers)}"""
+        with self.lock:
+            codes = {name: stage.code for name, stage in self.stages.items()}
+            return {stage.code: (stage.calls, stage.calls, stage.own_time, stage.time,
+                                 {codes[name]: (calls, calls, own, total)
+                                  for name, (calls, own, total) in stage.callers.items() if name in codes})
+                    for stage in self.stages.values()}
+
+    def dump_stats(self, path: str):
+        """Write the statistics to path, it can be read by pstats.Stats"""
+        with open(path, 'wb') as f:
+            marshal.dump(self.pstats(), f)
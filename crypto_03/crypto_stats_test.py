@@ -0,0 +1,77 @@
+import json
+import os
+import pstats
+import tempfile
+import unittest
+
+import crypto
+from crypto import *
+from crypto_stats import *
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        PROFILER.reset()
+
+
+    def tearDown(self):
+        PROFILER.disable()
+
+
+    def test_disabled(self):
+        encode = vars(Caesar)['encode']
+        PROFILER.enable()
+        self.assertIsNot(vars(Caesar)['encode'], encode)
+        PROFILER.disable()
+        self.assertIs(vars(Caesar)['encode'], encode)
+        self.assertNotIn('pow', vars(crypto))
+        self.assertNotIn('encode_batch', vars(Caesar))
+        Caesar().encode('THIS IS A TEST', 3)
+        self.assertEqual(PROFILER.stats(), {})
+
+
+    def test_counts(self):
+        c = Caesar(fast=False)
+        with PROFILER:
+            c.encode('THIS IS A TEST', 3)
+            c.encode_batch(['THIS', 'IS A TEST'], 3)
+        stats = PROFILER.stats()
+        self.assertEqual(stats['Caesar.encode']['calls'], 3)
+        self.assertEqual(stats['Caesar.encode']['bytes'], 27)
+        self.assertEqual(stats['Caesar.encode_batch']['bytes'], 13)
+        self.assertEqual(stats['cipher_']['calls'], 27)
+        self.assertEqual(stats['cipher_']['callers']['Caesar.encode']['calls'], 27)
+        self.assertEqual(stats['Caesar.encode']['callers']['Caesar.encode_batch']['calls'], 2)
+        encode = stats['Caesar.encode']
+        self.assertLessEqual(encode['own_time'], encode['time'])
+        self.assertGreaterEqual(encode['time'], stats['cipher_']['time'])
+
+
+    def test_rsa(self):
+        p, q, e = 2**61 - 1, 2**89 - 1, 65537
+        n, d = p * q, modular_inverse(e, (p - 1) * (q - 1))
+        rsa = RSA()
+        with PROFILER:
+            rsa.decode_bytes(rsa.encode_bytes(b'THIS IS A TEST', (n, e)), PrivateKey(n, d, p, q))
+        stats = PROFILER.stats()
+        self.assertGreater(stats['pow']['calls'], 0)
+        self.assertGreater(stats['RSA.decrypt_block']['calls'], 0)
+        self.assertEqual(stats['RSA.encode_bytes']['bytes'], 14)
+
+
+    def test_dump(self):
+        with PROFILER:
+            Hacker(Caesar()).kasiski_attack('THIS IS A TEST ' * 10)
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        PROFILER.dump_json(path)
+        with open(path) as f:
+            self.assertEqual(json.load(f)['Hacker.kasiski_attack']['calls'], 1)
+        PROFILER.dump_stats(path)
+        stats = pstats.Stats(path)
+        self.assertIn('Hacker.kasiski_attack', map(lambda code: code[2], stats.stats))
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,12 @@
+import io
+import itertools
+import math
+import os
+import pickle
+import tempfile
+import time
 import unittest
+import unittest.mock
 
 from crypto import *
 
@@ -65,6 +73,18 @@ class TestMultiplicative(unittest.TestCase):
         check_cipher(self, 'THIS IS A TEST', 26)
 
 
+    def test_key_table(self):
+        n = len(self.cipher.alphabet)
+        self.assertEqual(list(self.cipher.possible_keys()),
+                         [k for k in range(n) if math.gcd(k, n) == 1])
+        for key in self.cipher.possible_keys():
+            self.assertEqual(key * self.cipher.inverse(key) % n, 1)
+        self.assertIs(Multiplicative().inverses, self.cipher.inverses)
+        self.cipher.alphabet = UPPERCASE
+        self.assertEqual(len(self.cipher.possible_keys()), 12)
+        self.assertIn(self.cipher.generate_keys()[0], self.cipher.keys)
+
+
 class TestAffine(unittest.TestCase):
     def setUp(self):
         self.cipher = Affine()
@@ -90,6 +110,169 @@ class TestAffine(unittest.TestCase):
         check_cipher(self, 'THIS IS A TEST', (4, 3))
 
 
+    def test_schedule(self):
+        schedule = self.cipher.schedule
+        self.assertEqual(list(map(tuple, schedule.rows().tolist())), list(self.cipher.possible_keys()))
+        self.assertEqual(list(map(tuple, schedule.rows(1000, 1010).tolist())),
+                         list(self.cipher.possible_keys()[1000:1010]))
+        self.assertEqual(schedule[1234], self.cipher.possible_keys()[1234])
+        self.cipher.alphabet = UPPERCASE
+        self.assertEqual(len(self.cipher.schedule), 12 * 26)
+        self.assertEqual(self.cipher.schedule.rows().shape, (12 * 26, 2))
+        self.assertEqual(Affine(alphabet=map(chr, range(0x4e00, 0x4e00 + 8192))).schedule.keys.nbytes,
+                         4096 * 8)
+        self.assertEqual(self.cipher.decode_params((3, 4)), (9, -36))
+
+
+
+class TestTranslationTable(unittest.TestCase):
+    def setUp(self):
+        self.inp = 'THIS IS A TEST\n\twith ~ lower case and \u00e6\u00f8\u00e5'
+
+
+    def test_caesar_same_as_slow(self):
+        fast, slow = Caesar(), Caesar(fast=False)
+        for key in [0, 1, 26, 94, -3]:
+            self.assertEqual(fast.encode(self.inp, key), slow.encode(self.inp, key))
+            self.assertEqual(fast.decode(self.inp, key), slow.decode(self.inp, key))
+
+
+    def test_multiplicative_same_as_slow(self):
+        fast, slow = Multiplicative(), Multiplicative(fast=False)
+        for key in [1, 2, 11, 24]:
+            self.assertEqual(fast.encode(self.inp, key), slow.encode(self.inp, key))
+            self.assertEqual(fast.decode(self.inp, key), slow.decode(self.inp, key))
+
+
+    def test_affine_same_as_slow(self):
+        fast, slow = Affine(), Affine(fast=False)
+        for key in [(1, 11), (3, 4), (2, 2), (4, 3)]:
+            self.assertEqual(fast.encode(self.inp, key), slow.encode(self.inp, key))
+            self.assertEqual(fast.decode(self.inp, key), slow.decode(self.inp, key))
+
+
+    def test_table_is_cached(self):
+        c = Caesar()
+        self.assertIs(c.table(1, 3), Caesar().table(1, 3))
+
+
+
+class TestVectorizedUnbreakable(unittest.TestCase):
+    def test_same_as_slow(self):
+        fast, slow = Unbreakable(), Unbreakable(fast=False)
+        inp = 'THIS IS A TEST\nwith ~ lower case and \u00e6\u00f8\u00e5' * 7
+        for key in ['a', 'debug', 'X~ y', '\u00e6\u00f8']:
+            self.assertEqual(fast.encode(inp, key), slow.encode(inp, key))
+            self.assertEqual(fast.decode(inp, key), slow.decode(inp, key))
+
+
+    def test_chunk_boundaries(self):
+        c = Unbreakable()
+        inp, key = 'retarded zigzagged deprogramming' * 5, 'debug'
+        self.assertEqual(vigenere(inp, key, c.alphabet, chunk_size=7),
+                         c.encode(inp, key))
+        self.assertEqual(vigenere(inp, key, c.alphabet, sign=-1, chunk_size=3),
+                         c.decode(inp, key))
+
+
+    def test_empty(self):
+        c = Unbreakable()
+        self.assertEqual(c.encode('', 'debug'), '')
+
+
+
+class TestAlphabet(unittest.TestCase):
+    def setUp(self):
+        self.alphabets = [UPPERCASE, BASE64, Alphabet('\u03b1\u03b2\u03b3\u03b4\u03b5\u00e6\u00f8\u00e5 '),
+                          Alphabet(map(chr, range(0x4e00, 0x4e00 + 500)))]
+        self.ciphers = [(Caesar, 5), (Multiplicative, 7), (Affine, (7, 3)), (Unbreakable, 'debug')]
+
+
+    def test_lookup(self):
+        self.assertTrue(PRINTABLE.contiguous)
+        self.assertFalse(BASE64.contiguous)
+        self.assertEqual(BASE64.index_of('/'), 63)
+        self.assertIsNone(BASE64.index_of('-'))
+        self.assertEqual(UPPERCASE.index_of('B'), 1)
+        codes = codepoints('Az-/')
+        self.assertEqual(list(BASE64.indices_of(codes)), [0, 51, -1, 63])
+        with self.assertRaises(ValueError):
+            Alphabet('ABCA')
+
+
+    def test_fast_same_as_slow(self):
+        for alphabet, (cls, key) in itertools.product(self.alphabets, self.ciphers):
+            fast, slow = cls(alphabet=alphabet), cls(fast=False, alphabet=alphabet)
+            inp = "".join(alphabet[i * 7 % len(alphabet)] for i in range(100))
+            # Characters outside of contiguous alphabets are wrapped, which is lossy
+            inp += '' if alphabet.contiguous else '=-\n'
+            encoded = fast.encode(inp, key)
+            self.assertEqual(encoded, slow.encode(inp, key))
+            self.assertEqual(fast.decode(encoded, key), inp)
+            self.assertEqual(slow.decode(encoded, key), inp)
+            self.assertEqual(fast.encode_batch([inp, inp[3:]], key), [encoded, fast.encode(inp[3:], key)])
+
+
+    def test_affine_propagates(self):
+        cipher = Affine(fast=False)
+        cipher.alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+        self.assertEqual(cipher.caesar.alphabet, UPPERCASE)
+        self.assertEqual(cipher.encode('HELLO', (3, 4)), Affine(alphabet=UPPERCASE).encode('HELLO', (3, 4)))
+        cipher = Affine(alphabet=map(chr, range(ord('A'), ord('Z') + 1)))
+        self.assertEqual(cipher.multiplicative.alphabet, UPPERCASE)
+        self.assertEqual(cipher.encode('HELLO', (3, 4)), Affine(alphabet=UPPERCASE).encode('HELLO', (3, 4)))
+
+
+    def test_kasiski(self):
+        cipher = Unbreakable(alphabet=BASE64)
+        inp = "".join(filter(lambda c: c in BASE64.indices, open('english_words.txt').read()[:20000]))
+        key = 'Secret'
+        self.assertEqual(kasiski_attack(cipher, cipher.encode(inp, key)), key)
+
+
+
+class TestKeySpace(unittest.TestCase):
+    def test_affine_order(self):
+        c = Affine()
+        keys = c.possible_keys()
+        expected = list(itertools.product(c.multiplicative.possible_keys(), c.caesar.possible_keys()))
+        self.assertEqual(len(keys), len(expected))
+        self.assertEqual(list(keys), expected)
+        self.assertEqual(keys.key_at(1234), expected[1234])
+        self.assertEqual(keys[-1], expected[-1])
+        with self.assertRaises(IndexError):
+            keys.key_at(len(keys))
+
+
+    def test_shard(self):
+        keys = Multiplicative().possible_keys()
+        shards = list(map(lambda i: keys.shard(i, 7), range(7)))
+        self.assertEqual(sum(map(list, shards), []), list(keys))
+        self.assertEqual(shards[3].resume(2).key_at(0), shards[3].key_at(2))
+        self.assertEqual(pickle.loads(pickle.dumps(shards[3]))[0], shards[3][0])
+        with self.assertRaises(ValueError):
+            keys.shard(7, 7)
+
+
+    def test_chunk_ranges(self):
+        keys = Caesar().possible_keys()
+        self.assertEqual(list(map(len, keys.chunk_ranges(40))), [40, 40, 15])
+        self.assertEqual(list(keys.chunk_ranges(40, 90)), [range(90, 95)])
+
+
+    def test_checkpoint(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        os.remove(path)
+        keys = Caesar().possible_keys()
+        self.assertEqual(load_checkpoint(path, keys), 0)
+        save_checkpoint(path, keys, 42)
+        self.assertEqual(load_checkpoint(path, keys), 42)
+        with self.assertRaises(ValueError):
+            load_checkpoint(path, keys[1:])
+        os.remove(path)
+
+
 
 class TestRSA(unittest.TestCase):
     def setUp(self):
@@ -122,6 +305,345 @@ class TestRSA(unittest.TestCase):
         self.assertEqual(d, inp)
 
 
+class TestRSAPrivateKey(unittest.TestCase):
+    def setUp(self):
+        self.cipher = RSA()
+        self.bits = 64
+        p, q, e = 2**61 - 1, 2**89 - 1, 65537
+        n, d = p * q, modular_inverse(e, (p - 1) * (q - 1))
+        self.privk, self.pubk = PrivateKey(n, d, p, q), (n, e)
+
+
+    def test_is_n_d_tuple(self):
+        n, d = self.privk
+        self.assertEqual(self.privk, (n, d))
+
+
+    def test_crt_same_as_plain(self):
+        n, d = self.privk
+        for block in [0, 1, 2, 12345678901234567890, n - 1]:
+            self.assertEqual(RSA.decrypt_block(block, self.privk), pow(block, d, n))
+            self.assertEqual(RSA.decrypt_block(block, self.privk),
+                             RSA.decrypt_block(block, tuple(self.privk)))
+
+
+    def test_round_trip(self):
+        inp = 'THIALSDLJ lkjasdf poUIASD 123 |09802 39812'
+        e = self.cipher.encode(inp, self.pubk, bits=self.bits)
+        self.assertEqual(self.cipher.decode(e, self.privk, bits=self.bits), inp)
+        self.assertEqual(self.cipher.decode(e, tuple(self.privk), bits=self.bits), inp)
+
+
+    def test_packed_bytes(self):
+        for data in [b'', b'\0', b'\0\0abc\0', bytes(range(256)) * 3]:
+            e = self.cipher.encode_bytes(data, self.pubk)
+            self.assertEqual(self.cipher.decode_bytes(e, self.privk), data)
+
+
+    def test_packed_text_lossless(self):
+        # Multi-byte characters span the block boundaries
+        inp = '\u00e6\u00f8\u00e5 \u20ac THIALSDLJ \U0001F600' * 50
+        e = self.cipher.encode_bytes(inp, self.pubk)
+        self.assertEqual(self.cipher.decode_text(e, self.privk), inp)
+        self.assertTrue(all(map(lambda block: block < self.pubk[0], e)))
+
+
+    def test_executor(self):
+        from concurrent.futures import ProcessPoolExecutor
+        inp = 'THIALSDLJ lkjasdf poUIASD 123 |09802 39812' * 20
+        e = self.cipher.encode(inp, self.pubk, bits=self.bits)
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            self.assertEqual(self.cipher.encode(inp, self.pubk, bits=self.bits,
+                                                executor=executor), e)
+            self.assertEqual(self.cipher.decode(e, self.privk, bits=self.bits,
+                                                executor=executor), inp)
+
+
+    def test_pickle(self):
+        privk = pickle.loads(pickle.dumps(self.privk))
+        self.assertEqual(privk, self.privk)
+        self.assertEqual(privk.qinv, self.privk.qinv)
+
+
+
+class TestPrimes(unittest.TestCase):
+    def test_is_probable_prime(self):
+        for n in [2, 3, 1999, 2003, 2**61 - 1, 2**89 - 1]:
+            self.assertTrue(is_probable_prime(n))
+        for n in [0, 1, 4, 561, 2001, 2**61 + 1, (2**61 - 1) * (2**31 - 1)]:
+            self.assertFalse(is_probable_prime(n))
+
+
+    def test_random_prime(self):
+        for bits in [8, 16, 64, 256]:
+            p = random_prime(bits)
+            self.assertEqual(p.bit_length(), bits)
+            self.assertTrue(is_probable_prime(p))
+
+
+    def test_generate_primes_executor(self):
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            primes_ = generate_primes(128, 3, executor)
+        self.assertEqual(len(set(primes_)), 3)
+        self.assertTrue(all(map(is_probable_prime, primes_)))
+
+
+    def test_key_pool(self):
+        pool = KeyPool(bits=64, size=2)
+        rsa = RSA(key_pool=pool)
+        while pool.stats()['available'] < 2:
+            time.sleep(0.01)
+        pool.close()
+
+        privk, pubk = rsa.generate_keys(bits=64)
+        rsa.generate_keys(bits=64)
+        self.assertEqual(pool.stats()['hits'], 2)
+        rsa.generate_keys(bits=64)
+        self.assertEqual(pool.stats()['misses'], 1)
+
+        inp = 'THIALSDLJ lkjasdf poUIASD 123 |09802 39812'
+        self.assertEqual(rsa.decode(rsa.encode(inp, pubk, bits=32), privk, bits=32), inp)
+
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.messages = ['THIS IS A TEST', '', 'abc', 'zigzagged \u00e6\u00f8\u00e5', 'x' * 100]
+
+
+    def check_batch(self, cipher, key):
+        sender, reciever = Sender(key, cipher), Reciever(key, cipher)
+        encoded = sender.operate_cipher_batch(self.messages)
+        self.assertEqual(encoded, list(map(sender.operate_cipher, self.messages)))
+        self.assertEqual(reciever.operate_cipher_batch(encoded),
+                         list(map(reciever.operate_cipher, encoded)))
+
+
+    def test_caesar(self):
+        self.check_batch(Caesar(), 3)
+
+
+    def test_multiplicative(self):
+        self.check_batch(Multiplicative(), 11)
+
+
+    def test_affine(self):
+        self.check_batch(Affine(), (3, 4))
+
+
+    def test_unbreakable(self):
+        self.check_batch(Unbreakable(), 'debug')
+
+
+    def test_slow(self):
+        self.check_batch(Unbreakable(fast=False), 'debug')
+        self.check_batch(Affine(fast=False), (3, 4))
+
+
+    def test_empty(self):
+        self.assertEqual(Caesar().encode_batch([], 3), [])
+        self.assertEqual(Unbreakable().encode_batch([], 'debug'), [])
+        self.assertEqual(Unbreakable().encode_batch(['', ''], 'debug'), ['', ''])
+
+
+    def test_rsa(self):
+        c = RSA()
+        pubk = (3604617187326575099830723150055960731708890534417407738144869, 1708897424260872604511253961052260057236751681005790699060459)
+        privk = (3604617187326575099830723150055960731708890534417407738144869, 1670829181481326629478187490659425613113621340486702173415875)
+        encoded = c.encode_batch(self.messages, pubk, bits=100)
+        self.assertEqual(encoded, list(map(lambda m: c.encode(m, pubk, bits=100), self.messages)))
+        self.assertEqual(c.decode_batch(encoded, privk, bits=100), self.messages)
+
+
+
+class TestStream(unittest.TestCase):
+    def setUp(self):
+        self.inp = 'THIS IS A TEST \u00e6\u00f8\u00e5 with ~ lower case\n' * 11
+        self.chunks = [self.inp[i:i + 13] for i in range(0, len(self.inp), 13)]
+        data = self.inp.encode('utf_8')
+        # Split in the middle of the two byte characters
+        self.byte_chunks = [data[i:i + 7] for i in range(0, len(data), 7)]
+
+
+    def check_stream(self, cipher, key, **kwargs):
+        e = cipher.encode(self.inp, key, **kwargs)
+        for source in [self.chunks, self.byte_chunks, io.StringIO(self.inp), self.inp]:
+            self.assertEqual(''.join(cipher.encode_stream(source, key, **kwargs)), e)
+        self.assertEqual(''.join(cipher.decode_stream(iter(self.chunks),
+                                                      key, **kwargs)),
+                         cipher.decode(self.inp, key, **kwargs))
+
+
+    def test_caesar(self):
+        self.check_stream(Caesar(), 3)
+
+
+    def test_multiplicative(self):
+        self.check_stream(Multiplicative(), 11)
+
+
+    def test_affine(self):
+        self.check_stream(Affine(), (3, 4))
+
+
+    def test_unbreakable(self):
+        self.check_stream(Unbreakable(), 'debug')
+
+
+    def test_rsa(self):
+        c = RSA()
+        pubk = (3604617187326575099830723150055960731708890534417407738144869, 1708897424260872604511253961052260057236751681005790699060459)
+        privk = (3604617187326575099830723150055960731708890534417407738144869, 1670829181481326629478187490659425613113621340486702173415875)
+        e = c.encode(self.inp, pubk, bits=100)
+        for source in [self.chunks, self.byte_chunks, io.StringIO(self.inp)]:
+            blocks = [b for chunk in c.encode_stream(source, pubk, bits=100) for b in chunk]
+            self.assertEqual(blocks, e)
+        self.assertEqual(''.join(c.decode_stream(c.encode_stream(self.chunks, pubk, bits=100),
+                                                 privk, bits=100, batch=2)),
+                         c.decode(e, privk, bits=100))
+
+
+
+class TestWordlist(unittest.TestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.close(fd)
+        self.words = ['zigzagged', 'abc', 'deprogramming', '\u00e6\u00f8\u00e5', 'ab', 'abcd']
+        Wordlist.build(self.words + ['abc', ''], self.path)
+        self.wordlist = Wordlist(self.path)
+
+
+    def tearDown(self):
+        os.remove(self.path)
+
+
+    def test_contains(self):
+        for w in self.words:
+            self.assertIn(w, self.wordlist)
+        for w in ['', 'a', 'abce', 'zigzag', 'zz', '\u00e6']:
+            self.assertNotIn(w, self.wordlist)
+
+
+    def test_iter(self):
+        self.assertEqual(len(self.wordlist), len(self.words))
+        self.assertEqual(set(self.wordlist), set(self.words))
+
+
+    def test_pickle(self):
+        self.assertIn('abc', pickle.loads(pickle.dumps(self.wordlist)))
+
+
+    def test_prefixes(self):
+        for prefixes in [self.wordlist, WordPrefixes(self.words)]:
+            for prefix in ['', 'zig', 'abcd', 'deprogramming', '\u00e6\u00f8']:
+                self.assertTrue(prefixes.has_prefix(prefix))
+            for prefix in ['abce', 'zz', 'b', 'abcde']:
+                self.assertFalse(prefixes.has_prefix(prefix))
+            self.assertEqual(prefixes.longest, len('deprogramming'))
+
+
+    def test_empty(self):
+        Wordlist.build([], self.path)
+        self.assertNotIn('abc', Wordlist(self.path))
+
+
+    def test_interrupted_build(self):
+        with unittest.mock.patch('os.replace', side_effect=KeyboardInterrupt):
+            with self.assertRaises(KeyboardInterrupt):
+                Wordlist.build(['other', 'words'], self.path)
+        self.assertEqual(set(Wordlist(self.path)), set(self.words))
+        self.assertFalse(os.path.exists('{}.{}.tmp'.format(self.path, os.getpid())))
+
+
+    def test_lexical_match(self):
+        h = Hacker(Caesar())
+        h.set_wordlist(self.wordlist)
+        self.assertEqual(h.operate_cipher(Caesar().encode('abc zigzagged', 3)), 3)
+
+
+
+class TestLexicalScore(unittest.TestCase):
+    def setUp(self):
+        self.wordlist = {'this', 'is', 'a', 'test', "don't"}
+
+
+    def test_punctuation(self):
+        self.assertTrue(is_lexical_match('this is a test. (a test!)', self.wordlist))
+        self.assertFalse(is_lexical_match('This is a test.', self.wordlist))
+        self.assertTrue(is_lexical_match("don't test, \"this\" test.", self.wordlist))
+        self.assertFalse(is_lexical_match('this is a test ~', self.wordlist))
+        self.assertFalse(is_lexical_match('this is a test 1 2 3', self.wordlist))
+        self.assertFalse(is_lexical_match('this is,a test', self.wordlist))
+        self.assertFalse(is_lexical_match('this is not a test', self.wordlist))
+        self.assertFalse(is_lexical_match('', self.wordlist))
+
+
+    def test_stream_tokens(self):
+        chunks = ['thi', 's is', ' a te', 'st']
+        self.assertEqual(list(stream_tokens(chunks)), ['this', 'is', 'a', 'test'])
+        self.assertEqual(list(stream_tokens(chunks, complete=False)), ['this', 'is', 'a'])
+
+
+    def test_wrong_key(self):
+        # A wrong key that decodes to words mixed with digits and punctuation
+        wordlist = self.wordlist | {'ns', 'me'}
+        self.assertFalse(is_lexical_match('nS(9:01me', wordlist))
+        self.assertFalse(is_lexical_match('ns 9 me', wordlist))
+        self.assertFalse(is_lexical_match('Ns me', wordlist))
+        self.assertTrue(is_lexical_match('(ns, me)', wordlist))
+        self.assertTrue(lexical_score('nS(9:01me ns', wordlist).rejected)
+
+
+    def test_early_rejection(self):
+        consumed = []
+
+        def stream():
+            for chunk in ['this is ', 'not ', 'a test ', 'a test ']:
+                consumed.append(chunk)
+                yield chunk
+
+        score = lexical_score(stream(), self.wordlist)
+        self.assertTrue(score.rejected)
+        self.assertEqual((score.valid, score.words), (2, 3))
+        self.assertEqual(len(consumed), 2)
+
+
+    def test_no_whitespace(self):
+        consumed = []
+
+        def stream():
+            for chunk in ['xqzvkwjj' * 128] * 100:
+                consumed.append(chunk)
+                yield chunk
+
+        score = lexical_score(stream(), self.wordlist, prefixes=WordPrefixes(self.wordlist))
+        self.assertTrue(score.rejected)
+        self.assertEqual(len(consumed), 1)
+
+
+    def test_held_back_prefixes(self):
+        prefixes = WordPrefixes(self.wordlist)
+        for chunks in [['this is a te', 'st'], ["(don'", 't) a test.', '..'], ['this', '!', ' test']]:
+            self.assertTrue(lexical_score(chunks, self.wordlist, prefixes=prefixes).match)
+        for chunks in [['this is a tex', 't'], ['this is,', 'a test'], ['tests', ' a']]:
+            self.assertFalse(lexical_score(chunks, self.wordlist, prefixes=prefixes).match)
+        score = lexical_score(['this is a tex', 'tbook test'], self.wordlist, prefixes=prefixes,
+                              max_invalid=None)
+        self.assertEqual((score.valid, score.words), (4, 5))
+
+
+    def test_partial_score(self):
+        model = CharModel(self.wordlist | {'tests', 'testing', 'this'})
+        score = lexical_score('this is not a test', self.wordlist, model, max_invalid=None)
+        self.assertFalse(score.rejected)
+        self.assertEqual(score.fraction, 0.8)
+        garbage = lexical_score('xqz vkw jjq', self.wordlist, model, max_invalid=None)
+        self.assertEqual(garbage.fraction, 0)
+        self.assertGreater(score.likelihood, garbage.likelihood)
+
+
+
 class TestHacker(unittest.TestCase):
     def setUp(self):
         with open('english_words.txt') as f:
@@ -172,6 +694,125 @@ class TestHacker(unittest.TestCase):
         h.set_wordlist(self.wordlist)
         self.assertEqual(h.operate_cipher(e), key)
 
+    def test_crack_caesar(self):
+        c = Caesar()
+        inp, key = 'zigzagged abc deprogramming zigzagged abc', 24
+        h = Hacker(c)
+        h.set_wordlist(self.wordlist)
+        self.assertEqual(h.crack(c.encode(inp, key), workers=2, chunk_size=8, prefix=10), key)
+
+
+    def test_crack_affine(self):
+        c = Affine()
+        inp, key = 'deprogramming', (1, 11)
+        h = Hacker(c)
+        h.set_wordlist(self.wordlist)
+        self.assertEqual(h.crack(c.encode(inp, key), workers=2), key)
+
+
+    def test_crack_no_match(self):
+        h = Hacker(Caesar())
+        h.set_wordlist(set())
+        self.assertIsNone(h.crack('zigzagged', workers=2))
+
+
+    def test_rank_candidates_near_miss(self):
+        c = Caesar()
+        inp, key = 'zigzagged abc qqqxz deprogramming', 24
+        h = Hacker(c)
+        h.set_wordlist(self.wordlist)
+        self.assertIsNone(h.operate_cipher(c.encode(inp, key)))
+        (best, score), *_ = h.rank_candidates(c.encode(inp, key), max_invalid=2)
+        self.assertEqual(best, key)
+        self.assertEqual(score.fraction, 0.75)
+
+
+    def test_crack_shards(self):
+        c = Caesar()
+        inp, key = 'zigzagged abc deprogramming zigzagged abc', 24
+        h = Hacker(c)
+        h.set_wordlist(self.wordlist)
+        keys = c.possible_keys()
+        self.assertIsNone(h.crack(c.encode(inp, key), workers=2, keys=keys.shard(1, 3)))
+        self.assertEqual(h.crack(c.encode(inp, key), workers=2, keys=keys.shard(0, 3)), key)
+
+
+    def test_crack_checkpoint(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        os.remove(path)
+        c = Caesar()
+        inp, key = 'zigzagged abc deprogramming zigzagged abc', 24
+        h = Hacker(c)
+        h.set_wordlist(self.wordlist)
+        # Resuming after the key skips it
+        save_checkpoint(path, c.possible_keys(), 30)
+        self.assertIsNone(h.crack(c.encode(inp, key), workers=2, chunk_size=8, checkpoint=path))
+        self.assertEqual(load_checkpoint(path, c.possible_keys()), len(c.possible_keys()))
+        save_checkpoint(path, c.possible_keys(), 16)
+        self.assertEqual(h.crack(c.encode(inp, key), workers=2, chunk_size=8, checkpoint=path), key)
+        self.assertLessEqual(load_checkpoint(path, c.possible_keys()), key)
+        os.remove(path)
+
+
+    def test_frequency_attack_caesar(self):
+        c = Caesar()
+        inp, key = 'zigzagged abc deprogramming zigzagged', 24
+        h = Hacker(c)
+        h.set_wordlist(self.wordlist)
+        self.assertEqual(h.frequency_attack(c.encode(inp, key)), key)
+
+
+    def test_frequency_attack_affine(self):
+        c = Affine()
+        inp, key = 'deprogramming zigzagged abc', (7, 11)
+        h = Hacker(c)
+        h.set_wordlist(self.wordlist)
+        self.assertEqual(h.frequency_attack(c.encode(inp, key), top=20), key)
+
+
+    def test_rank_keys(self):
+        c = Multiplicative()
+        inp = 'the quick brown fox jumps over the lazy dog and the end'
+        self.assertEqual(rank_keys(c, c.encode(inp, 11))[0], 11)
+
+
+    def test_is_prefix_match(self):
+        self.assertTrue(is_prefix_match('zigzagged deprogr', self.wordlist))
+        self.assertFalse(is_prefix_match('zigzagged deprogr', self.wordlist, complete=True))
+        self.assertFalse(is_prefix_match('zigzaggedx deprogramming', self.wordlist))
+
+
+    def test_prefix_survivors(self):
+        inp = 'it was the best of times it was the worst of times it was the age of wisdom'
+        wordlist = self.wordlist | set(inp.split())
+        prefixes = word_prefixes(wordlist)
+        for c, key in [(Caesar(), 3), (Affine(), (7, 11))]:
+            head = c.encode(inp, key)[:32]
+            survivors = list(filter(lambda k: is_prefix_match(c.decode(head, k), wordlist, prefixes=prefixes),
+                                    c.possible_keys()))
+            self.assertIn(key, survivors)
+            self.assertLessEqual(len(survivors), len(c.possible_keys()) // 50)
+
+
+    def test_kasiski_attack(self):
+        c = Unbreakable()
+        inp = ('It was the best of times, it was the worst of times, it was the age of '
+               'wisdom, it was the age of foolishness, it was the epoch of belief, it '
+               'was the epoch of incredulity, it was the season of light, it was the '
+               'season of darkness, it was the spring of hope, it was the winter of '
+               'despair, we had everything before us, we had nothing before us, we '
+               'were all going direct to heaven, we were all going direct the other '
+               'way - in short, the period was so far like the present period, that '
+               'some of its noisiest authorities insisted on its being received, for '
+               'good or for evil, in the superlative degree of comparison only.')
+        key = 'debug'
+        e = c.encode(inp, key)
+        h = Hacker(c)
+        self.assertEqual(h.kasiski_attack(e), key)
+        self.assertEqual(h.kasiski_attack(iter([e[:17], e[17:200], e[200:]])), key)
+
+
     def test_unbreakable(self):
         c = Unbreakable()
         inp, key = 'retarded', 'debug'